@@ -0,0 +1,49 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+from PyQt5 import QtCore, QtWidgets
+
+
+class StatsDialog(QtWidgets.QDialog):
+    """
+    Counters per RTT up channel, refreshed by the main window while shown.
+    """
+
+    # counter keys of MainWindow.channel_stats() and their column titles
+    COLUMNS = (
+        ('received',        u"接收字节"),
+        ('queued_in',       u"入队字节"),
+        ('dropped',         u"队列丢弃字节"),
+        ('polls',           u"轮询次数"),
+        ('full_polls',      u"缓冲区满"),
+        ('near_full_polls', u"缓冲区将满"),
+        ('overruns',        u"覆盖次数"),
+        ('overrun_bytes',   u"覆盖字节"),
+        ('seq_missing',     u"序号缺失"),
+        ('watermark_hits',  u"超过警戒水位"),
+        ('lost_estimate',   u"估计丢失字节"),
+    )
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(u"通道统计")
+        self.table = QtWidgets.QTableWidget(0, len(self.COLUMNS), self)
+        self.table.setHorizontalHeaderLabels([title for key, title in self.COLUMNS])
+        self.table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.addWidget(self.table)
+        self.resize(900, 220)
+
+    def update_stats(self, stats):
+        """
+        @param {int: dict} stats: Counters per channel, the absent ones shown as '-'.
+        """
+        channels = sorted(stats)
+        self.table.setRowCount(len(channels))
+        self.table.setVerticalHeaderLabels([u"通道 {}".format(index) for index in channels])
+        for row, index in enumerate(channels):
+            for col, (key, title) in enumerate(self.COLUMNS):
+                value = stats[index].get(key)
+                item = QtWidgets.QTableWidgetItem('-' if value is None else str(value))
+                item.setTextAlignment(QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
+                self.table.setItem(row, col, item)
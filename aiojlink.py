@@ -0,0 +1,166 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import jlinkio
+
+# what a channel does with data once its queue is full: drop and count it, or leave it in the target buffer
+DROP  = 'drop'
+BLOCK = 'block'
+
+
+class AsyncJlink(object):
+    """
+    Awaitable target access: the blocking DLL calls run in the single JlinkIO thread owning the probe.
+    """
+
+    def __init__(self, jlink, io=None):
+        self.jlink = jlink
+        self.io = io if io is not None else jlinkio.JlinkIO(jlink)
+
+    def run(self, func, *args, prio=jlinkio.PRIO_POLL):
+        """
+        Runs func(*args) in the I/O thread.
+        @return asyncio.Future: Completes with the result of func.
+        """
+        return asyncio.wrap_future(self.io.submit(func, *args, prio=prio))
+
+    async def read(self, addr, data_len):
+        return await self.run(self.jlink.read, addr, data_len)
+
+    async def write(self, addr, data):
+        await self.run(self.jlink.write, addr, bytes(data), prio=jlinkio.PRIO_INTERACTIVE)
+
+    async def close(self):
+        """
+        Closes the probe and lets the I/O thread exit.
+        """
+        await self.run(self.jlink.close)
+        self.io.shutdown(wait=False)
+
+
+class AsyncRTTSession(object):
+    """
+    Polls an rtt backend from the event loop, every up channel in one read_all() like the console, each channel
+    buffered in a bounded queue of byte chunks. A full queue only affects its own channel: with DROP the chunks that
+    do not fit are counted in dropped, with BLOCK the channel is left in the target buffer, the others are then read
+    one by one until the consumer catches up. Channels without a queue are drained and discarded.
+    """
+
+    def __init__(self, ajlink, backend, channels=(0,), interval=0.01, maxsize=64, policies=None):
+        """
+        @param {int: str} policies: DROP or BLOCK per channel, DROP for the absent ones.
+        """
+        self.ajlink = ajlink
+        self.backend = backend
+        self.interval = interval
+        self._queues = {channel: asyncio.Queue(maxsize) for channel in channels}
+        self.policies = {channel: (policies or {}).get(channel, DROP) for channel in channels}
+        # bytes and chunks dropped per channel
+        self.dropped = {channel: 0 for channel in channels}
+        self.dropped_chunks = {channel: 0 for channel in channels}
+        self._task = None
+        self._closed = False
+        self._error = None
+
+    async def start(self):
+        await self.ajlink.run(self.backend.start)
+        self._task = asyncio.ensure_future(self._poll())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._close_queues()
+        await self.ajlink.run(self.backend.stop)
+
+    async def read_channel(self, channel=0):
+        """
+        Waits for the next chunk received on an up channel.
+        @return bytes: Data received, empty once the session is stopped.
+        """
+        q = self._queues[channel]
+        if self._closed and q.empty():
+            self._raise_error()
+            return b''
+        chunk = await q.get()
+        if chunk is None:
+            self._raise_error()
+            return b''
+        return chunk
+
+    async def write_channel(self, channel, data):
+        """
+        Writes to a down channel ahead of queued polls.
+        @return int: Number of bytes accepted by the target.
+        """
+        return await self.ajlink.run(self.backend.write, channel, bytes(data), prio=jlinkio.PRIO_INTERACTIVE)
+
+    def channel(self, channel=0):
+        """
+        Returns an async iterator over the chunks received on an up channel, ending when the session stops.
+        """
+        return _ChannelIterator(self, channel)
+
+    async def _poll(self):
+        try:
+            while True:
+                held = [channel for channel, q in self._queues.items() if self.policies[channel] == BLOCK and q.full()]
+                if held:
+                    chunks = {}
+                    for channel in self._queues:
+                        if channel not in held:
+                            chunks[channel] = await self.ajlink.run(self.backend.read, channel)
+                else:
+                    received = await self.ajlink.run(self.backend.read_all)
+                    chunks = {channel: received[channel] for channel in self._queues if channel < len(received)}
+                idle = True
+                for channel, chunk in chunks.items():
+                    if chunk:
+                        idle = False
+                        self._deliver(channel, bytes(chunk))
+                if idle:
+                    await asyncio.sleep(self.interval)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._error = e
+            self._close_queues()
+
+    def _deliver(self, channel, chunk):
+        try:
+            self._queues[channel].put_nowait(chunk)
+        except asyncio.QueueFull:
+            self.dropped[channel] += len(chunk)
+            self.dropped_chunks[channel] += 1
+
+    def _close_queues(self):
+        self._closed = True
+        for q in self._queues.values():
+            try:
+                q.put_nowait(None)
+            except asyncio.QueueFull:
+                pass
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise self._error
+
+
+class _ChannelIterator(object):
+    def __init__(self, session, channel):
+        self.session = session
+        self.channel = channel
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        chunk = await self.session.read_channel(self.channel)
+        if not chunk:
+            raise StopAsyncIteration
+        return chunk
@@ -0,0 +1,189 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import time
+import cache
+import jlink
+
+# candidate SWD clocks in kHz, tried from the slowest up
+AUTOTUNE_SPEEDS_KHZ = (1000, 2000, 4000, 8000, 12000, 15000, 20000, 30000, 50000)
+AUTOTUNE_CACHE = 'speeds.json'
+
+
+def parse_speed(spec):
+    """
+    @param str spec: SWD speed in kHz, 0 for none, e.g. "12000".
+    @return int: Speed in kHz.
+    """
+    try:
+        speed = int(spec)
+    except ValueError:
+        speed = -1
+    if speed < 0:
+        raise ValueError("The SWD speed must be a number of kHz, 0 for none, not '{}'.".format(spec))
+    return speed
+
+
+class SpeedTuner(object):
+    """
+    Finds the fastest SWD clock that reads a constant memory region reliably, and remembers it per probe and target.
+    Every candidate speed times bulk reads of the region, each read must match a reference read at the slowest speed.
+    """
+
+    def __init__(self, jlink, addr, size=0x1000, rounds=4, speeds=AUTOTUNE_SPEEDS_KHZ, error_threshold=8):
+        """
+        @param int addr: Start of a region the firmware does not modify, e.g. the vector table.
+        @param int size: Bytes per timed read.
+        @param int rounds: Timed reads per speed.
+        @param int error_threshold: Read errors after which check() tunes again.
+        """
+        self.jlink = jlink
+        self.addr = addr
+        self.size = size
+        self.rounds = rounds
+        self.speeds = sorted(speeds)
+        self.error_threshold = error_threshold
+        self.speed = None
+        self.results = {}
+        # message of the last tuning check() gave up on, None once one succeeded
+        self.last_error = None
+        self._errors_seen = 0
+
+    def key(self):
+        return "{}:{:08X}".format(self.jlink.get_SN(), self.jlink.get_ID())
+
+    def apply(self):
+        """
+        Sets the speed stored for this probe and target, tunes first if there is none.
+        @return int: Speed in kHz.
+        """
+        speed = cache.load(AUTOTUNE_CACHE).get(self.key())
+        if speed is None:
+            return self.tune()
+        self.speed = speed
+        self.jlink.set_speed(speed)
+        self.ignore_errors()
+        return speed
+
+    def tune(self):
+        """
+        Steps through the candidate speeds, stops at the first unstable one and keeps the fastest stable one.
+        @return int: Speed in kHz.
+        """
+        self.results = {}
+        self.jlink.set_speed(self.speeds[0])
+        reference = self.jlink.read(self.addr, self.size)
+        for speed in self.speeds:
+            throughput = self.measure(speed, reference)
+            if throughput is None:
+                break
+            self.results[speed] = throughput
+
+        if not self.results:
+            raise jlink.JlinkError("No stable SWD speed found at or above {} kHz.".format(self.speeds[0]))
+
+        # the slowest speed within 5% of the best throughput keeps the most margin, e.g. when the probe caps the clock
+        best = max(self.results.values())
+        self.speed = min(speed for speed, throughput in self.results.items() if throughput >= best * 0.95)
+        self.jlink.set_speed(self.speed)
+        self.ignore_errors()
+
+        speeds = cache.load(AUTOTUNE_CACHE)
+        speeds[self.key()] = self.speed
+        cache.store(AUTOTUNE_CACHE, speeds)
+        return self.speed
+
+    def measure(self, speed, reference):
+        """
+        @return float: Bytes/s at speed, None if any read failed or differed from reference.
+        """
+        self.jlink.set_speed(speed)
+        self.jlink.clear_error()
+        errors = self.jlink.read_errors
+        buf = bytearray(self.size)
+
+        start = time.perf_counter()
+        for _ in range(self.rounds):
+            self.jlink.read_into(self.addr, buf)
+            if buf != reference:
+                return None
+        elapsed = time.perf_counter() - start
+
+        if self.jlink.read_errors != errors or self.jlink.has_error():
+            return None
+        return self.size * self.rounds / max(elapsed, 1e-9)
+
+    def ignore_errors(self):
+        """
+        Leaves the read errors so far out of check(), e.g. those of a control block scan probing past the end of RAM.
+        """
+        self._errors_seen = self.jlink.read_errors
+
+    def check(self):
+        """
+        Tunes again once error_threshold read errors happened since the last tuning, cheap enough for every poll.
+        Never raises: when no speed is stable, typically while the link is failing, it backs off to the slowest
+        candidate, keeps the error in last_error and tries again after error_threshold more read errors.
+        @return bool: True if the speed was changed.
+        """
+        if self.jlink.read_errors - self._errors_seen < self.error_threshold:
+            return False
+        try:
+            self.tune()
+            self.last_error = None
+        except jlink.JlinkError as e:
+            self.last_error = str(e)
+            print("SWD speed tuning failed: '{}'.".format(e))
+            self.speed = self.speeds[0]
+            try:
+                self.jlink.set_speed(self.speed)
+            except jlink.JlinkError:
+                pass
+            self.ignore_errors()
+        return True
+
+
+class SpeedBoost(object):
+    """
+    Raises the SWD clock while the poll scheduler reports overflow pressure, and restores the normal clock once
+    there was none for hold s. Only a clock known to be stable should be the boost, e.g. the fastest one SpeedTuner
+    measured without errors.
+    """
+
+    def __init__(self, jlink, normal, boost, hold=1.0):
+        """
+        @param int normal: Speed in kHz outside of pressure.
+        @param int boost: Speed in kHz under pressure.
+        """
+        self.jlink = jlink
+        self.normal = normal
+        self.boost = boost
+        self.hold = hold
+        self.boosted = False
+        # times the clock was raised
+        self.boosts = 0
+        self._until = 0.0
+
+    def update(self, pressure, now=None):
+        """
+        Cheap enough for every poll, sets the speed only when boosting starts or ends.
+        @return bool: True while boosted.
+        """
+        now = time.perf_counter() if now is None else now
+        if pressure:
+            self._until = now + self.hold
+            if not self.boosted:
+                self.jlink.set_speed(self.boost)
+                self.boosted = True
+                self.boosts += 1
+        elif self.boosted and now >= self._until:
+            self.jlink.set_speed(self.normal)
+            self.boosted = False
+        return self.boosted
+
+    def reset(self, normal):
+        """
+        Takes a new normal speed that is already set, e.g. after SpeedTuner.tune().
+        """
+        self.normal = normal
+        self.boosted = False
@@ -0,0 +1,69 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+Microbenchmarks of the jlink.Jlink wrappers against a simulated target, no probe needed.
+
+    python bench_jlink.py
+"""
+
+import ctypes
+import ctypes.util
+import timeit
+import jlink
+import simtarget
+from simtarget import SIM_RAM_BASE
+
+
+class _UntypedFuncPtr(ctypes._CFuncPtr):
+    """
+    What CDLL.__getattr__ hands out: no argtypes, int restype.
+    """
+    _flags_ = ctypes._FUNCFLAG_CDECL
+    _restype_ = ctypes.c_int
+
+
+def bench(label, stmt, number):
+    t = min(timeit.repeat(stmt, number=number, repeat=5)) / number
+    print("{:<28}{:>12.2f} us/call".format(label, t * 1e6))
+
+
+def bench_write(j):
+    for size in (16, 1024, 64 * 1024):
+        for kind in (bytes, bytearray):
+            data = kind(size)
+            bench("write {} {} B".format(kind.__name__, size), lambda: j.write(SIM_RAM_BASE, data), 2000)
+
+
+def bench_read(j):
+    for size in (16, 1024, 64 * 1024):
+        buf = bytearray(size)
+        bench("read {} B".format(size), lambda: j.read(SIM_RAM_BASE, size), 2000)
+        bench("read_into {} B".format(size), lambda: j.read_into(SIM_RAM_BASE, buf), 2000)
+
+
+def bench_prototypes(j):
+    """
+    The simulated entry points are python callbacks whose cost drowns the call convention, so the untyped call with
+    per-call ctypes wrappers (before) and the bound prototype (after) are compared on a C function of libc instead.
+    """
+    libc = ctypes.CDLL(ctypes.util.find_library('c'))
+    proto = ctypes.CFUNCTYPE(ctypes.c_long, ctypes.c_long)
+    typed = proto(('labs', libc))
+    untyped = _UntypedFuncPtr(ctypes.cast(typed, ctypes.c_void_p).value)
+    value = -SIM_RAM_BASE
+
+    bench("C call untyped (before)", lambda: untyped(ctypes.c_long(value)), 200000)
+    bench("C call prototype (after)", lambda: typed(value), 200000)
+
+    # the wrappers over the simulated target, callback included
+    addr = SIM_RAM_BASE
+    bench("sim read_32 method", lambda: j.read_32(addr), 20000)
+    bench("sim write_32 method", lambda: j.write_32(addr, 0x12345678), 20000)
+    bench("sim get_register method", lambda: j.get_register(jlink.CpuRegister.R0), 20000)
+
+
+if __name__ == '__main__':
+    j = simtarget.sim_jlink()
+    bench_prototypes(j)
+    bench_write(j)
+    bench_read(j)
@@ -0,0 +1,128 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+Throughput and latency comparison of the RTT acquisition backends, against a simulated target by default.
+
+    python bench_rtt.py [--rate BYTES_PER_S] [--burst N] [--up-size N] [--seconds N] [--interval S]
+    python bench_rtt.py --dll JLink_x64.dll --addr 0x20000000
+    python bench_rtt.py --adaptive [--min-ms 1 --max-ms 100] [--watermark 0.75]
+    python bench_rtt.py --reconnect 20 [--dll JLink_x64.dll]
+"""
+
+import argparse
+import time
+import discover
+import jlink
+import rtt
+import scheduler
+import session
+import simtarget
+
+def run(backend, seconds, interval, target=None, sched=None):
+    """
+    Drains channel 0 the way MainWindow.serial_recv does, sleeping interval s or as sched decides between polls.
+    @return (int, int, [float]): Bytes received, number of polls and, with a simulated target,
+                                 the delay between writing and receiving the first byte of each chunk.
+    """
+    received = polls = 0
+    latencies = []
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        b = backend.read(0)
+        if b and target is not None:
+            latencies.append(time.perf_counter() - target.produced_at(received))
+        received += len(b)
+        polls += 1
+        if sched is not None:
+            time.sleep(sched.update(len(b), backend.fill, written=backend.written))
+        elif interval:
+            time.sleep(interval)
+    return received, polls, latencies
+
+
+def reconnect(j, rounds):
+    """
+    Times Stop/Start cycles of a session: the first connect scans for the control block, the others reuse it.
+    @return (float, [float]): First connect time and the warm reconnect times in s.
+    """
+    s = session.JlinkSession(j)
+    scan = discover.ControlBlockScanner(j).scan
+    s.connect(scan)
+    cold = s.connect_time
+    warm = []
+    for _ in range(rounds):
+        s.disconnect()
+        s.connect(scan)
+        warm.append(s.connect_time)
+    s.disconnect()
+    return cold, warm
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rate', type=int, default=512 * 1024, help='simulated producer rate in bytes/s')
+    parser.add_argument('--burst', type=int, default=64, help='simulated producer burst size in bytes')
+    parser.add_argument('--up-size', type=int, default=0x400, help='simulated up fifo size, a power of two for kfifo')
+    parser.add_argument('--seconds', type=float, default=2.0)
+    parser.add_argument('--interval', type=float, default=0.01, help='sleep between polls, 0 to spin')
+    parser.add_argument('--dll', help='measure a real probe instead of the simulated target')
+    parser.add_argument('--addr', type=lambda s: int(s, 0), help='RTT control block address on the real target')
+    parser.add_argument('--adaptive', action='store_true', help='let a scheduler.PollScheduler pick the poll interval')
+    parser.add_argument('--min-ms', type=float, default=1.0, help='adaptive min poll interval')
+    parser.add_argument('--max-ms', type=float, default=100.0, help='adaptive max poll interval')
+    parser.add_argument('--watermark', type=float, default=scheduler.DEFAULT_HIGH_WATERMARK,
+                        help='adaptive high watermark, fill fraction of the up fifo')
+    parser.add_argument('--reconnect', type=int, metavar='N', help='time N warm Stop/Start cycles instead')
+    args = parser.parse_args()
+
+    if args.reconnect:
+        load = time.perf_counter()
+        j = jlink.Jlink(args.dll) if args.dll else simtarget.sim_jlink()
+        load = time.perf_counter() - load
+        cold, warm = reconnect(j, args.reconnect)
+        print("load {:.2f} ms, first connect {:.2f} ms, reconnect mean {:.2f} ms max {:.2f} ms".format(
+            load * 1e3, cold * 1e3, sum(warm) / len(warm) * 1e3, max(warm) * 1e3))
+        return
+
+    for name, backend_cls in sorted(rtt.BACKENDS.items()):
+        if args.dll:
+            target = None
+            j = jlink.Jlink(args.dll)
+            j.set_mode(jlink.JLINK_MODE_SWD)
+            j.set_speed(4000)
+            addr = args.addr
+        else:
+            if name == 'segger':
+                # the stock firmware leaves every buffer but 0 unconfigured
+                target = simtarget.SeggerSimTarget(up_sizes=(args.up_size, 0), down_sizes=(0x100, 0))
+            else:
+                target = simtarget.SimTarget(up_size=args.up_size)
+            j = simtarget.sim_jlink(target)
+            addr = target.cb_addr
+
+        backend = backend_cls(j, addr)
+        backend.start()
+        if target is not None:
+            target.start(simtarget.Producer(args.rate, args.burst))
+        sched = None
+        if args.adaptive:
+            sched = scheduler.PollScheduler(args.min_ms / 1000, args.max_ms / 1000, high_watermark=args.watermark)
+        received, polls, latencies = run(backend, args.seconds, args.interval, target, sched)
+        backend.stop()
+
+        line = "{:<8}{:>10.1f} KB/s {:>8} polls {:>5.2f} round trips/poll".format(
+            name, received / args.seconds / 1024, polls, backend.round_trips / max(backend.polls, 1))
+        if target is not None:
+            target.stop()
+            if latencies:
+                line += " latency mean {:.2f} ms max {:.2f} ms".format(
+                    sum(latencies) / len(latencies) * 1e3, max(latencies) * 1e3)
+            line += " {:>10} B lost by the producer".format(target.lost)
+        if sched is not None and sched.predictor.rates:
+            line += ", {} watermark hits, {:.0f} B lost estimated".format(
+                sum(sched.predictor.hits), sum(sched.predictor.lost))
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
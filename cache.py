@@ -0,0 +1,37 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import json
+import os
+
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.rtt-console')
+
+
+def cache_path(name):
+    return os.path.join(CACHE_DIR, name)
+
+
+def load(name):
+    """
+    Returns the dict stored under name, empty when missing or unreadable.
+    """
+    try:
+        with open(cache_path(name), 'r') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def store(name, data):
+    """
+    Atomically replaces the dict stored under name, failures are ignored since a cache is optional.
+    """
+    path = cache_path(name)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+        os.replace(path + '.tmp', path)
+    except OSError:
+        pass
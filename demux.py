@@ -0,0 +1,272 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+Demultiplexed acquisition: the data of every up channel goes through its own bounded queue to its own sinks,
+each channel delivered by its own thread, so a slow sink or a busy channel never holds up the others or the polling.
+A sink is any object with write(data), receiving the bytes of its channel in order in the channel thread, and close().
+"""
+
+import collections
+import socket
+import threading
+
+# bytes a channel queues before dropping new data
+DEFAULT_QUEUE_BYTES = 1 << 20
+
+
+class CallbackSink(object):
+    """
+    Hands every batch to func(data), e.g. a decoder or the emit() of a Qt signal for a view.
+    """
+
+    def __init__(self, func):
+        self.func = func
+
+    def write(self, data):
+        self.func(data)
+
+    def close(self):
+        pass
+
+
+class ViewSink(object):
+    """
+    Hands every batch to func(data) for a view updated later in another thread, e.g. through a queued Qt signal.
+    At most max_bytes are handed over and not yet shown, see done(), newer batches are refused.
+    """
+
+    def __init__(self, func, max_bytes=DEFAULT_QUEUE_BYTES):
+        self.func = func
+        self.max_bytes = max_bytes
+        # bytes handed over and not yet shown
+        self.pending = 0
+        self._lock = threading.Lock()
+
+    def write(self, data):
+        with self._lock:
+            if self.pending + len(data) > self.max_bytes:
+                return False
+            self.pending += len(data)
+        self.func(data)
+        return True
+
+    def done(self, n):
+        """
+        Called by the view once it showed n bytes handed over.
+        """
+        with self._lock:
+            self.pending -= n
+
+    def close(self):
+        pass
+
+
+class FileSink(object):
+    def __init__(self, path, mode='ab'):
+        self.file = open(path, mode)
+
+    def write(self, data):
+        self.file.write(data)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class SocketSink(object):
+    """
+    Listens on a TCP port and streams the channel to every connected client, clients that fall behind are dropped.
+    """
+
+    def __init__(self, port, host='127.0.0.1'):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind((host, port))
+        self.server.listen(4)
+        self.server.setblocking(False)
+        self.clients = []
+
+    def write(self, data):
+        while True:
+            try:
+                client, addr = self.server.accept()
+            except (BlockingIOError, OSError):
+                break
+            client.settimeout(1.0)
+            self.clients.append(client)
+        for client in list(self.clients):
+            try:
+                client.sendall(data)
+            except OSError:
+                client.close()
+                self.clients.remove(client)
+
+    def close(self):
+        for client in self.clients:
+            client.close()
+        self.server.close()
+
+
+def parse_sinks(spec):
+    """
+    @param str spec: Semicolon separated channel=kind:arg items, kind being file (a path) or tcp (a port),
+                     e.g. "1=file:telemetry.bin;2=tcp:19021".
+    @return {int: [(str, str)]}: Sink kinds and arguments per channel.
+    """
+    sinks = {}
+    for item in filter(None, (s.strip() for s in spec.split(';'))):
+        try:
+            channel, target = item.split('=', 1)
+            kind, arg = target.split(':', 1)
+            channel = int(channel, 0)
+            if kind == 'tcp':
+                int(arg)
+        except ValueError:
+            channel = kind = None
+        if kind not in ('file', 'tcp') or channel < 0:
+            raise ValueError("Channel sinks must be channel=file:path or channel=tcp:port items, not '{}'.".format(item))
+        sinks.setdefault(channel, []).append((kind, arg))
+    return sinks
+
+
+def make_sink(kind, arg):
+    if kind == 'file':
+        return FileSink(arg)
+    return SocketSink(int(arg))
+
+
+class Channel(object):
+    """
+    Bounded queue of one channel and the thread delivering it: put() never blocks, data that does not fit is dropped
+    and counted. The thread hands the sinks everything queued at once, so a slow sink gets fewer, larger batches.
+    A sink whose write() returns False refused the batch, it is counted as dropped too.
+    """
+
+    def __init__(self, index, sinks, max_bytes=DEFAULT_QUEUE_BYTES):
+        self.index = index
+        self.sinks = list(sinks)
+        self.max_bytes = max_bytes
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        # bytes received (queued_in in stats()), queued now, delivered, dropped, chunks dropped and sink failures
+        self.received = 0
+        self.queued = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.dropped_chunks = 0
+        self.sink_errors = 0
+        self._thread = threading.Thread(target=self._run, name='rtt-channel-{}'.format(index), daemon=True)
+        self._thread.start()
+
+    def put(self, data):
+        """
+        @return bool: False if data was dropped because the queue is full.
+        """
+        with self._cond:
+            self.received += len(data)
+            if self.queued + len(data) > self.max_bytes:
+                self.dropped += len(data)
+                self.dropped_chunks += 1
+                return False
+            self._queue.append(data)
+            self.queued += len(data)
+            self._cond.notify()
+            return True
+
+    def close(self):
+        """
+        Delivers what is queued, then closes the sinks.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    break
+                data = self._queue.popleft() if len(self._queue) == 1 else b''.join(self._queue)
+                self._queue.clear()
+                self.queued = 0
+            refused = False
+            for sink in self.sinks:
+                try:
+                    refused |= sink.write(data) is False
+                except Exception as e:
+                    self.sink_errors += 1
+                    print("RTT channel {} sink failed: '{}'.".format(self.index, e))
+            if refused:
+                self.dropped += len(data)
+                self.dropped_chunks += 1
+            else:
+                self.delivered += len(data)
+        for sink in self.sinks:
+            sink.close()
+
+    def stats(self):
+        return {'queued_in': self.received, 'queued': self.queued, 'delivered': self.delivered,
+                'dropped': self.dropped, 'dropped_chunks': self.dropped_chunks, 'sink_errors': self.sink_errors}
+
+
+class Demux(object):
+    """
+    Routes the per-channel data of a backend read_all() to the channels, created on their first data.
+    """
+
+    def __init__(self, sinks=None, default_sinks=None, max_bytes=DEFAULT_QUEUE_BYTES):
+        """
+        @param {int: [Sink]} sinks: Sinks per channel.
+        @param callable default_sinks: default_sinks(index) returning the sinks of a channel absent from sinks.
+        """
+        self.sinks = dict(sinks or {})
+        self.default_sinks = default_sinks
+        self.max_bytes = max_bytes
+        self.channels = {}
+        self._lock = threading.Lock()
+
+    def channel(self, index):
+        with self._lock:
+            channel = self.channels.get(index)
+            if channel is None:
+                sinks = self.sinks.get(index)
+                if sinks is None:
+                    sinks = self.default_sinks(index) if self.default_sinks is not None else []
+                channel = self.channels[index] = Channel(index, sinks, self.max_bytes)
+            return channel
+
+    def feed(self, chunks):
+        """
+        @param [bytearray] chunks: Data per channel index, empty ones are skipped.
+        """
+        for index, data in enumerate(chunks):
+            if data:
+                self.channel(index).put(data)
+
+    def put(self, index, data):
+        return self.channel(index).put(data)
+
+    def close(self):
+        """
+        Delivers what is queued and closes every sink, the channel counters stay readable.
+        """
+        with self._lock:
+            channels = list(self.channels.values())
+        for channel in channels:
+            channel.close()
+        # sinks of channels that never received data
+        for index, sinks in self.sinks.items():
+            if all(c.index != index for c in channels):
+                for sink in sinks:
+                    sink.close()
+
+    def stats(self):
+        """
+        @return {int: dict}: Counters per channel, see Channel.stats().
+        """
+        with self._lock:
+            return {index: channel.stats() for index, channel in self.channels.items()}
@@ -0,0 +1,163 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+RTT control block discovery: bulk reads of the target RAM regions searched for the control block tag.
+
+    python discover.py [--dll JLink_x64.dll] [--regions stm32h7|0x20000000:0x20000,...] [--block N]
+"""
+
+import argparse
+import time
+import jlink
+
+RTT_TAG = b"SEGGER RTT"
+DEFAULT_SCAN_BLOCK = 0x4000
+# smallest read a failed block is split into, the step of the former byte-wise scan
+MIN_SCAN_BLOCK = 0x80
+
+# RAM regions as (start, size), searched in order, the usual places of the control block first
+RAM_REGIONS = {
+    'cortex-m': ((0x20000000, 0x10000),),
+    'stm32f4':  ((0x20000000, 0x30000), (0x10000000, 0x10000)),
+    'stm32f7':  ((0x20000000, 0x80000),),
+    'stm32h7':  ((0x24000000, 0x80000), (0x20000000, 0x20000), (0x30000000, 0x48000), (0x38000000, 0x10000)),
+    'stm32l4':  ((0x20000000, 0x18000), (0x10000000, 0x8000)),
+    'nrf52':    ((0x20000000, 0x40000),),
+    'imxrt':    ((0x20000000, 0x80000), (0x20200000, 0x80000)),
+}
+DEFAULT_RAM_REGIONS = 'cortex-m'
+
+
+def parse_regions(spec):
+    """
+    @param str spec: A RAM_REGIONS name, or comma separated start:size pairs, e.g. "0x20000000:0x20000,0x10000000:0x8000".
+    @return ((int, int), ...): Regions as (start, size).
+    """
+    if spec in RAM_REGIONS:
+        return RAM_REGIONS[spec]
+    try:
+        regions = tuple(tuple(int(v, 0) for v in r.split(':')) for r in spec.split(','))
+    except ValueError:
+        regions = None
+    if not regions or any(len(r) != 2 or r[1] <= 0 for r in regions):
+        raise ValueError("RAM regions must be one of {} or start:size pairs, not '{}'.".format(
+            ', '.join(sorted(RAM_REGIONS)), spec))
+    return regions
+
+
+class ControlBlockNotFound(jlink.JlinkError):
+    pass
+
+
+class ControlBlockScanner(object):
+    """
+    Reads the regions in blocks of block_size bytes and searches each with bytes.find.
+    Consecutive blocks overlap by len(tag) - 1 bytes, so a tag straddling two blocks is still found.
+    After a failed read the readable start of the block is found in MIN_SCAN_BLOCK steps, so only its unreadable
+    tail is skipped, e.g. past the end of the RAM of a part smaller than the region.
+    """
+
+    def __init__(self, jlink, regions=RAM_REGIONS[DEFAULT_RAM_REGIONS], block_size=DEFAULT_SCAN_BLOCK, tag=RTT_TAG):
+        """
+        @param int block_size: Bytes per read, 4-64 KB amortize the DLL round trip without stalling the probe.
+        """
+        if block_size < len(tag):
+            raise ValueError('The block_size parameter must be at least {} bytes.'.format(len(tag)))
+        self.jlink = jlink
+        self.regions = regions
+        self.block_size = block_size
+        self.tag = tag
+        # figures of the last scan(): bytes read successfully, reads, failed reads and duration in s
+        self.scanned = 0
+        self.reads = 0
+        self.errors = 0
+        self.elapsed = 0.0
+
+    def scan(self):
+        """
+        @return int: Address of the first tag found.
+        """
+        self.scanned = self.reads = self.errors = 0
+        start = time.perf_counter()
+        try:
+            for base, size in self.regions:
+                addr = self._scan_region(base, size)
+                if addr is not None:
+                    return addr
+        finally:
+            self.elapsed = time.perf_counter() - start
+        raise ControlBlockNotFound("No RTT control block in {} ({} KB read in {:.0f} ms, {} failed reads).".format(
+            ', '.join("0x{:08X}+0x{:X}".format(base, size) for base, size in self.regions),
+            self.scanned // 1024, self.elapsed * 1000, self.errors))
+
+    def _scan_region(self, base, size):
+        end = base + size
+        overlap = len(self.tag) - 1
+        buf = bytearray(self.block_size + overlap)
+        view = memoryview(buf)
+        addr = base
+        while addr < end:
+            n = min(self.block_size + overlap, end - addr)
+            stop = self._read(addr, view[:n])
+            off = buf.find(self.tag, 0, stop)
+            if off >= 0:
+                return addr + off
+            addr += self.block_size
+        return None
+
+    def _read(self, addr, view):
+        """
+        Reads view from addr. When that fails, the readable part is searched by bisection in MIN_SCAN_BLOCK steps,
+        on the assumption that the block holds the end of a memory, as few reads as the block has halvings.
+        @return int: Length of the readable prefix of view, the bytes read into it.
+        """
+        if self._read_ok(addr, view):
+            return len(view)
+        # unmapped or protected, e.g. the region is larger than this part's RAM
+        self.errors += 1
+        lo, hi = 0, len(view)
+        while hi - lo > MIN_SCAN_BLOCK:
+            mid = lo + max((hi - lo) // 2 // MIN_SCAN_BLOCK * MIN_SCAN_BLOCK, MIN_SCAN_BLOCK)
+            if self._read_ok(addr + lo, view[lo:mid]):
+                lo = mid
+            else:
+                hi = mid
+        return lo
+
+    def _read_ok(self, addr, view):
+        errors = self.jlink.read_errors
+        self.jlink.read_into(addr, view)
+        self.reads += 1
+        if self.jlink.read_errors != errors:
+            return False
+        self.scanned += len(view)
+        return True
+
+    def report(self):
+        return "{} KB in {} reads, {:.1f} ms".format(self.scanned // 1024, self.reads, self.elapsed * 1000)
+
+
+def main():
+    import simtarget
+    parser = argparse.ArgumentParser(description='Searches the target RAM for the RTT control block.')
+    parser.add_argument('--dll', help='probe the target through this DLL, the simulated target otherwise')
+    parser.add_argument('--regions', type=parse_regions, default=DEFAULT_RAM_REGIONS,
+                        help='a preset ({}) or start:size pairs'.format(', '.join(sorted(RAM_REGIONS))))
+    parser.add_argument('--block', type=lambda s: int(s, 0), default=DEFAULT_SCAN_BLOCK, help='bytes per read')
+    args = parser.parse_args()
+
+    if args.dll:
+        j = jlink.Jlink(args.dll)
+        j.set_mode(jlink.JLINK_MODE_SWD)
+        j.set_speed(4000)
+    else:
+        j = simtarget.sim_jlink()
+    scanner = ControlBlockScanner(j, args.regions, args.block)
+    try:
+        print("0x{:08X} ({})".format(scanner.scan(), scanner.report()))
+    except ControlBlockNotFound as e:
+        raise SystemExit(str(e))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+Minimal ELF32 symbol reader, enough to find the RTT control block in the firmware image.
+Only the header, the section headers and the symbol table pages of the mapped file are touched.
+
+    python elf.py firmware.elf [--symbol _SEGGER_RTT]
+"""
+
+import argparse
+import hashlib
+import mmap
+import struct
+import cache
+import jlink
+
+RTT_SYMBOL = '_SEGGER_RTT'
+ELF_CACHE = 'elf.json'
+# ELF_CACHE is emptied once it holds this many entries
+ELF_CACHE_SIZE = 64
+
+_ELFCLASS32 = 1
+_ELFDATA2LSB = 1
+_ELFDATA2MSB = 2
+_SHT_SYMTAB = 2
+
+
+class ElfError(jlink.JlinkError):
+    pass
+
+
+class ElfFile(object):
+    """
+    Maps path read-only and parses the ELF32 header and section headers, symbols are searched on demand.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            try:
+                self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise ElfError("{} is empty.".format(path))
+        try:
+            self._parse()
+        except (struct.error, IndexError):
+            self.close()
+            raise ElfError("{} is truncated.".format(path))
+        except ElfError:
+            self.close()
+            raise
+
+    def _parse(self):
+        mm = self.mm
+        if mm[:4] != b'\x7fELF':
+            raise ElfError("{} is not an ELF file.".format(self.path))
+        if mm[4] != _ELFCLASS32:
+            raise ElfError("{} is not a 32-bit ELF file.".format(self.path))
+        if mm[5] not in (_ELFDATA2LSB, _ELFDATA2MSB):
+            raise ElfError("{} has an unknown byte order.".format(self.path))
+        self.endian = '<' if mm[5] == _ELFDATA2LSB else '>'
+
+        # e_shoff, e_shentsize, e_shnum
+        shoff, = struct.unpack_from(self.endian + 'I', mm, 32)
+        shentsize, shnum = struct.unpack_from(self.endian + 'HH', mm, 46)
+        if shoff == 0 or shnum == 0:
+            raise ElfError("{} has no section headers.".format(self.path))
+        # sh_name, sh_type, sh_flags, sh_addr, sh_offset, sh_size, sh_link, sh_info, sh_addralign, sh_entsize
+        shdr = struct.Struct(self.endian + '10I')
+        self.sections = [shdr.unpack_from(mm, shoff + i * shentsize) for i in range(shnum)]
+
+    def close(self):
+        self.mm.close()
+
+    def _section_data(self, sh):
+        offset, size = sh[4], sh[5]
+        if offset + size > len(self.mm):
+            raise ElfError("{} is truncated.".format(self.path))
+        return memoryview(self.mm)[offset:offset + size]
+
+    def symbol(self, name):
+        """
+        @return (int, int): Value and size of the first symbol called name, None if there is none.
+        """
+        key = name.encode() + b'\0'
+        for sh in self.sections:
+            if sh[1] != _SHT_SYMTAB or sh[6] >= len(self.sections):
+                continue
+            str_offset, str_size = self.sections[sh[6]][4:6]
+            # string offsets ending with name, names may share the tail of a longer string
+            names = set()
+            pos = self.mm.find(key, str_offset, str_offset + str_size)
+            while pos >= 0:
+                names.add(pos - str_offset)
+                pos = self.mm.find(key, pos + 1, str_offset + str_size)
+            if not names:
+                continue
+
+            symtab = self._section_data(sh)
+            try:
+                # st_name, st_value, st_size, st_info, st_other, st_shndx
+                for st_name, st_value, st_size, st_info, st_other, st_shndx in struct.iter_unpack(
+                        self.endian + 'IIIBBH', symtab[:len(symtab) - len(symtab) % 16]):
+                    if st_name in names and st_shndx != 0:
+                        return st_value, st_size
+            finally:
+                symtab.release()
+        return None
+
+
+def file_hash(path):
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return hashlib.sha1(mm).hexdigest()
+
+
+def symbol_address(path, name=RTT_SYMBOL):
+    """
+    Looks name up in the ELF at path, cached in ELF_CACHE by the file content hash.
+    @return int: Symbol address.
+    """
+    try:
+        key = "{}:{}".format(file_hash(path), name)
+    except (OSError, ValueError) as e:
+        raise ElfError("Could not read {}: '{}'.".format(path, e))
+    symbols = cache.load(ELF_CACHE)
+    if key in symbols:
+        return symbols[key]
+
+    elf = ElfFile(path)
+    try:
+        sym = elf.symbol(name)
+    finally:
+        elf.close()
+    if sym is None:
+        raise ElfError("{} has no symbol {}.".format(path, name))
+
+    if len(symbols) >= ELF_CACHE_SIZE:
+        symbols = {}
+    symbols[key] = sym[0]
+    cache.store(ELF_CACHE, symbols)
+    return sym[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prints the address of a symbol of an ELF32 file.')
+    parser.add_argument('elf')
+    parser.add_argument('--symbol', default=RTT_SYMBOL)
+    args = parser.parse_args()
+    try:
+        print("0x{:08X}".format(symbol_address(args.elf, args.symbol)))
+    except ElfError as e:
+        raise SystemExit(str(e))
+
+
+if __name__ == '__main__':
+    main()
@@ -6,11 +6,27 @@ import os, sys
 import ctypes
 import codecs
 import enum
+from array import array
 
 _DEFAULT_JLINK_SPEED_KHZ = 4000
+# read_many() merges regions separated by at most this many bytes into one transfer
+_DEFAULT_READ_MERGE_GAP = 256
 JLINK_MODE_JTAG = 0
 JLINK_MODE_SWD  = 1
 
+# JLINK_RTTERMINAL_Control() commands and buffer directions
+JLINK_RTTERMINAL_CMD_START     = 0
+JLINK_RTTERMINAL_CMD_STOP      = 1
+JLINK_RTTERMINAL_CMD_GETDESC   = 2
+JLINK_RTTERMINAL_CMD_GETNUMBUF = 3
+JLINK_RTTERMINAL_CMD_GETSTAT   = 4
+JLINK_RTTERMINAL_BUFFER_DIR_UP   = 0
+JLINK_RTTERMINAL_BUFFER_DIR_DOWN = 1
+
+# array typecodes of exactly 2 and 4 bytes
+_U16_TYPECODE = 'H'
+_U32_TYPECODE = 'I' if array('I').itemsize == 4 else 'L'
+
 if sys.platform.lower().startswith('win'):
     _DEFAULT_SEGGER_ROOT_PATH = r'C:\Program Files (x86)\SEGGER' if 'PROGRAMFILES(X86)' in os.environ else r'C:\Program Files\SEGGER'
 elif sys.platform.lower().startswith('linux'):
@@ -19,13 +35,66 @@ elif sys.platform.lower().startswith('dar'):
     _DEFAULT_SEGGER_ROOT_PATH = r'/Applications/SEGGER/JLink'
 
 
+# explicit DLL path, skips the discovery
+JLINK_DLL_ENV = 'JLINK_DLL_PATH'
+_DLL_CACHE = 'dll.json'
+# (root, root mtime, path) of the last discovery in this process
+_dll_memo = None
+
+
 def find_latest_dll():
+    """
+    Returns the JLink DLL path from JLINK_DLL_PATH, else the newest one of the SEGGER installation.
+    The discovery is cached on disk and reused while the mtime of the SEGGER root is unchanged, so the common
+    case costs one stat of the root.
+    @return str: DLL path, None if there is no SEGGER installation.
+    """
+    global _dll_memo
+
+    override = os.environ.get(JLINK_DLL_ENV)
+    if override:
+        return override
+
+    try:
+        mtime = os.stat(_DEFAULT_SEGGER_ROOT_PATH).st_mtime
+    except OSError:
+        return None
+
+    if _dll_memo is not None and _dll_memo[:2] == (_DEFAULT_SEGGER_ROOT_PATH, mtime):
+        return _dll_memo[2]
+
+    import cache
+    cached = cache.load(_DLL_CACHE)
+    if cached.get('root') == _DEFAULT_SEGGER_ROOT_PATH and cached.get('mtime') == mtime:
+        path = cached.get('path')
+    else:
+        path = _scan_latest_dll()
+        if path is None:
+            return None
+        cache.store(_DLL_CACHE, {'root': _DEFAULT_SEGGER_ROOT_PATH, 'mtime': mtime, 'path': path,
+                                 'version': _dll_version_from_path(path)})
+    _dll_memo = (_DEFAULT_SEGGER_ROOT_PATH, mtime, path)
+    return path
+
+
+def _dll_version_from_path(path):
+    """
+    JLink_V###x of the installation directory on Windows, x.y.z of libjlinkarm.so.x.y.z elsewhere.
+    """
+    if sys.platform.lower().startswith('win'):
+        return os.path.relpath(path, _DEFAULT_SEGGER_ROOT_PATH).split(os.sep)[0]
+    return os.path.basename(path).split('.so.')[-1]
+
+
+def _scan_latest_dll():
 
     if not os.path.isdir(_DEFAULT_SEGGER_ROOT_PATH):
         return None
 
     if sys.platform.lower().startswith('win'):
         jlink_sw_dirs = sorted([f for f in os.listdir(_DEFAULT_SEGGER_ROOT_PATH) if fnmatch.fnmatch(f, 'JLink_V*')])
+        if not jlink_sw_dirs:
+            return None
         if sys.maxsize > 2**32:
             jlinkdll = os.path.join('bin_x64', 'JLink_x64.dll')
         else:
@@ -35,10 +104,14 @@ def find_latest_dll():
     elif sys.platform.lower().startswith('linux'):
         # Adding .dummy to filenames in linux (.so.x.x.x.dummy) because python compare strings will then work properly with the version number compare.
         jlink_so_files = sorted([f + ".dummy" for f in os.listdir(_DEFAULT_SEGGER_ROOT_PATH) if fnmatch.fnmatch(f, 'libjlinkarm.so*')])
+        if not jlink_so_files:
+            return None
         return os.path.join(_DEFAULT_SEGGER_ROOT_PATH, jlink_so_files[-1][:-len(".dummy")])
 
     elif sys.platform.lower().startswith('dar'):
         jlink_dylib_files = sorted([f for f in os.listdir(_DEFAULT_SEGGER_ROOT_PATH) if fnmatch.fnmatch(f, 'libjlinkarm.*dylib')])
+        if not jlink_dylib_files:
+            return None
         return os.path.join(_DEFAULT_SEGGER_ROOT_PATH, jlink_dylib_files[-1])
 
 @enum.unique
@@ -89,6 +162,124 @@ class JlinkError(Exception):
         pass
 
 
+_U8P  = ctypes.POINTER(ctypes.c_uint8)
+_U16P = ctypes.POINTER(ctypes.c_uint16)
+_U32P = ctypes.POINTER(ctypes.c_uint32)
+
+# (symbol, restype, argtypes) of every entry point used, see JLinkARMDLL.h
+_PROTOTYPES = (
+    ('JLINKARM_GetDLLVersion',      ctypes.c_uint32,  ()),
+    ('JLINKARM_TIF_Select',         ctypes.c_int,     (ctypes.c_int,)),
+    ('JLINKARM_IsOpen',             ctypes.c_bool,    ()),
+    ('JLINKARM_Open',               ctypes.c_char_p,  ()),
+    ('JLINKARM_Close',              None,             ()),
+    ('JLINKARM_Reset',              ctypes.c_int,     ()),
+    ('JLINKARM_Go',                 None,             ()),
+    ('JLINKARM_Halt',               ctypes.c_bool,    ()),
+    ('JLINKARM_Step',               ctypes.c_bool,    ()),
+    ('JLINKARM_ClrError',           None,             ()),
+    ('JLINKARM_HasError',           ctypes.c_bool,    ()),
+    ('JLINKARM_SetSpeed',           None,             (ctypes.c_uint32,)),
+    ('JLINKARM_SetMaxSpeed',        None,             ()),
+    ('JLINKARM_GetSpeed',           ctypes.c_uint16,  ()),
+    ('JLINKARM_GetVoltage',         ctypes.c_int,     ()),
+    ('JLINKARM_IsHalted',           ctypes.c_int8,    ()),
+    ('JLINKARM_IsConnected',        ctypes.c_bool,    ()),
+    ('JLINKARM_ClrBP',              None,             (ctypes.c_uint32,)),
+    ('JLINKARM_SetBP',              None,             (ctypes.c_uint32, ctypes.c_uint32)),
+    ('JLINKARM_WriteReg',           ctypes.c_bool,    (ctypes.c_int, ctypes.c_uint32)),
+    ('JLINKARM_ReadReg',            ctypes.c_uint32,  (ctypes.c_int,)),
+    ('JLINKARM_WriteMem',           ctypes.c_int,     (ctypes.c_uint32, ctypes.c_uint32, ctypes.c_void_p)),
+    ('JLINKARM_ReadMem',            ctypes.c_int,     (ctypes.c_uint32, ctypes.c_uint32, ctypes.c_void_p)),
+    ('JLINKARM_ReadMemU32',         ctypes.c_int,     (ctypes.c_uint32, ctypes.c_uint32, _U32P, _U8P)),
+    ('JLINKARM_ReadMemU16',         ctypes.c_int,     (ctypes.c_uint32, ctypes.c_uint32, _U16P, _U8P)),
+    ('JLINKARM_ReadMemU8',          ctypes.c_int,     (ctypes.c_uint32, ctypes.c_uint32, _U8P, _U8P)),
+    ('JLINKARM_WriteU32',           ctypes.c_int,     (ctypes.c_uint32, ctypes.c_uint32)),
+    ('JLINKARM_WriteU16',           ctypes.c_int,     (ctypes.c_uint32, ctypes.c_uint16)),
+    ('JLINKARM_WriteU8',            ctypes.c_int,     (ctypes.c_uint32, ctypes.c_uint8)),
+    ('JLINKARM_GetHardwareVersion', ctypes.c_uint32,  ()),
+    ('JLINKARM_GetFeatureString',   None,             (ctypes.c_void_p,)),
+    ('JLINKARM_GetOEMString',       ctypes.c_int,     (ctypes.c_void_p,)),
+    ('JLINKARM_GetCompileDateTime', ctypes.c_char_p,  ()),
+    ('JLINKARM_GetSN',              ctypes.c_int,     ()),
+    ('JLINKARM_GetId',              ctypes.c_uint32,  ()),
+    ('JLINK_RTTERMINAL_Control',    ctypes.c_int,     (ctypes.c_uint32, ctypes.c_void_p)),
+    ('JLINK_RTTERMINAL_Read',       ctypes.c_int,     (ctypes.c_uint32, ctypes.c_void_p, ctypes.c_uint32)),
+    ('JLINK_RTTERMINAL_Write',      ctypes.c_int,     (ctypes.c_uint32, ctypes.c_void_p, ctypes.c_uint32)),
+)
+
+
+class _RTTerminalStart(ctypes.Structure):
+    """
+    JLINK_RTTERMINAL_START, a zero ConfigBlockAddress lets the DLL search for the control block.
+    """
+    _fields_ = [('ConfigBlockAddress', ctypes.c_uint32),
+                ('Dummy0', ctypes.c_uint32),
+                ('Dummy1', ctypes.c_uint32),
+                ('Dummy2', ctypes.c_uint32)]
+
+
+def _missing_symbol(name):
+    def call(*args):
+        raise JlinkError("The JLINK DLL does not export {}.".format(name))
+    return call
+
+
+def _stub_symbol(proto, func):
+    """
+    Calls a python stub through a C callback of the prototype, so arguments get the real ctypes conversions.
+    ctypes only prints exceptions raised inside callbacks, they are carried over and raised again here.
+    A callback cannot return a c_char_p without leaking it, strings go through a c_void_p to a buffer kept per value.
+    """
+    errors = []
+    strings = proto._restype_ is ctypes.c_char_p
+    buffers = {}
+    if strings:
+        proto = ctypes.CFUNCTYPE(ctypes.c_void_p, *proto._argtypes_)
+
+    def trampoline(*args):
+        try:
+            ret = func(*args)
+            if strings and ret is not None:
+                if ret not in buffers:
+                    buffers[ret] = ctypes.create_string_buffer(ret)
+                ret = ctypes.addressof(buffers[ret])
+            return ret
+        except BaseException as e:
+            errors.append(e)
+            return 0
+    funcptr = proto(trampoline)
+
+    def call(*args):
+        ret = funcptr(*args)
+        if errors:
+            raise errors.pop()
+        if strings:
+            return ctypes.string_at(ret) if ret else None
+        return ret
+    call.funcptr = funcptr
+    return call
+
+
+def bind_prototypes(lib):
+    """
+    Resolves every entry point of _PROTOTYPES once.
+    @param lib: A loaded ctypes.CDLL, or any object whose attributes are python callables (a stub library).
+    @return dict: Typed function pointers keyed by symbol name.
+    """
+    funcs = {}
+    for name, restype, argtypes in _PROTOTYPES:
+        proto = ctypes.CFUNCTYPE(restype, *argtypes)
+        try:
+            if isinstance(lib, ctypes.CDLL):
+                funcs[name] = proto((name, lib))
+            else:
+                funcs[name] = _stub_symbol(proto, getattr(lib, name))
+        except AttributeError:
+            funcs[name] = _missing_symbol(name)
+    return funcs
+
+
 class Jlink(object):
     def __init__(self, dllpath=None):
         self.jlink = None
@@ -109,10 +300,78 @@ class Jlink(object):
                 raise JlinkError("Could not load the JLINK DLL: '{}'.".format(e))
         else:
             raise JlinkError("Could not load JLinkARM.dll.")
+        self._bind(self.jlink)
+
+    @classmethod
+    def from_library(cls, lib, dllpath=None):
+        """
+        Builds a Jlink on a library that is already loaded, or on an object with the same entry points, e.g. a
+        simulated target or a trace replay.
+        @param str dllpath: Path reported for the library, None if there is none.
+        """
+        j = cls.__new__(cls)
+        j.dllpath = dllpath
+        j.jlink = lib
+        j._bind(lib)
+        return j
+
+    def _bind(self, lib):
+        """
+        Binds the typed function pointers as self._<symbol without the JLINKARM_/JLINK_ prefix>.
+        """
+        # failed JLINKARM_ReadMem transfers, never reset
+        self.read_errors = 0
+        self.stats = None
+        self._funcs = bind_prototypes(lib)
+        self._wrappers = []
+        self._rebind()
+
+    def _rebind(self):
+        """
+        Applies the call wrappers (stats, recording) on top of the raw function pointers, none means raw calls.
+        """
+        for name, func in self._funcs.items():
+            for wrap in self._wrappers:
+                func = wrap(name, func)
+            setattr(self, '_' + name.split('_', 1)[1], func)
+
+    def add_call_wrapper(self, wrap):
+        """
+        @param callable wrap: wrap(symbol, func) returning the callable to use instead of func.
+        """
+        self._wrappers.append(wrap)
+        self._rebind()
+
+    def remove_call_wrapper(self, wrap):
+        self._wrappers.remove(wrap)
+        self._rebind()
+
+    def enable_stats(self, stats=None):
+        """
+        Routes every DLL call through a jlinkstats.JlinkStats recorder.
+        @param JlinkStats stats: Recorder to use, a new one if None.
+        @return JlinkStats: The recorder.
+        """
+        if stats is None:
+            import jlinkstats
+            stats = jlinkstats.JlinkStats()
+        self.disable_stats()
+        self.stats = stats
+        self.add_call_wrapper(stats.wrap)
+        return stats
+
+    def disable_stats(self):
+        """
+        Puts the raw function pointers back, disabled stats cost nothing. Stops the periodic dump of the recorder.
+        """
+        if self.stats is not None:
+            self.stats.stop_dump()
+            self.remove_call_wrapper(self.stats.wrap)
+            self.stats = None
 
     def __del__(self):
         try:
-            if self.jlink:
+            if self.jlink and sys.platform.lower().startswith('win'):
                 ctypes.cdll.kernel32.FreeLibrary(self.jlink._handle)
         except Exception as e:
             print("Could not unload the JLINK DLL: '{}'.".format(e))
@@ -125,7 +384,7 @@ class Jlink(object):
         Returns the JLinkARM.dll version.
         @return (int, int, str): Tuple containing the major, minor and revision of the dll.
         """
-        v = self.jlink.JLINKARM_GetDLLVersion()
+        v = self._GetDLLVersion()
         major = int(v / 10000)
         v -= major * 10000
         minor = int(v / 100)
@@ -134,57 +393,64 @@ class Jlink(object):
         return major, minor, chr(revision)
 
     def set_mode(self, mode=JLINK_MODE_SWD):
-        self.jlink.JLINKARM_TIF_Select(mode)
+        self._TIF_Select(mode)
 
     def is_open(self):
         """
         Checks if the JLinkARM.dll is open.
         @return bool: True if open.
         """
-        return self.jlink.JLINKARM_IsOpen()
+        return self._IsOpen()
 
     def open(self):
         """
         Opens the JLinkARM.dll.
         """
-        self.jlink.JLINKARM_Open()
+        #const char* JLINKARM_Open(), NULL on success
+        err = self._Open()
+        if err:
+            raise JlinkError("Could not open the J-Link: '{}'.".format(err.decode(errors='replace')))
 
     def close(self):
         """
         Closes and frees the JLinkARM DLL.
         """
-        self.jlink.JLINKARM_Close()
+        self._Close()
 
     def reset(self):
         """
         system reset.
         """
-        self.jlink.JLINKARM_Reset()
+        self._Reset()
 
     def go(self):
         """
         Starts the device CPU .
         """
         #void JLINKARM_Go()
-        self.jlink.JLINKARM_Go()
+        self._Go()
 
     def halt(self):
         """
         Halts the device CPU.
         """
         #bool JLINKARM_Halt()
-        self.jlink.JLINKARM_Halt()
+        self._Halt()
 
     def step(self):
         """
         Runs the device CPU for one instruction.
         """
         #bool JLINKARM_Step()
-        self.jlink.JLINKARM_Step()
+        self._Step()
 
     def clear_error(self):
         #void JLINKARM_ClrError()
-        self.jlink.JLINKARM_ClrError()
+        self._ClrError()
+
+    def has_error(self):
+        #bool JLINKARM_HasError()
+        return self._HasError()
 
     def set_speed(self, speed=_DEFAULT_JLINK_SPEED_KHZ):
         """
@@ -193,49 +459,49 @@ class Jlink(object):
         """
         if not self._is_u32(speed):
             raise ValueError('The speed parameter must be an unsigned 32-bit value.')
-        self.jlink.JLINKARM_SetSpeed(speed)
+        self._SetSpeed(speed)
 
     def set_max_speed(self):
         """
         set the max speed.
         """
-        self.jlink.JLINKARM_SetMaxSpeed()
+        self._SetMaxSpeed()
 
     def get_speed(self):
         """
         Returns the speed.
         @return int: speed.
         """
-        return self.jlink.JLINKARM_GetSpeed()
+        return self._GetSpeed()
 
     def get_voltage(self):
         """
         Returns the target voltage.
         @return int: voltage.
         """
-        return self.jlink.JLINKARM_GetVoltage()
+        return self._GetVoltage()
 
     def is_halted(self):
         """
         Checks if the device CPU is halted.
         @return boolean: True if halted.
         """
-        return self.jlink.JLINKARM_IsHalted()
+        return self._IsHalted()
 
     def is_connected(self):
         """
         Checks if the target is connected.
         @return bool: True if connected.
         """
-        return self.jlink.JLINKARM_IsConnected()
+        return self._IsConnected()
 
     def clear_break_point(self, idx):
         #void JLINKARM_ClrBP(UInt32 index)
-        self.jlink.JLINKARM_ClrBP(idx)
+        self._ClrBP(idx)
 
     def set_break_point(self, idx, addr):
         #void JLINKARM_SetBP(UInt32 index, UInt32 addr)
-        self.jlink.JLINKARM_SetBP(idx, addr)
+        self._SetBP(idx, addr)
 
     def set_register(self, register_name, value):
         """
@@ -253,9 +519,7 @@ class Jlink(object):
         if register_name is None:
             raise ValueError('Parameter register_name must be of type int, str or CpuRegister enumeration.')
 
-        register_name = ctypes.c_int(register_name.value)
-        value = ctypes.c_uint32(value)
-        self.jlink.JLINKARM_WriteReg(register_name, value)
+        self._WriteReg(register_name.value, value)
 
     def get_register(self, register_name):
         """
@@ -270,26 +534,32 @@ class Jlink(object):
         if register_name is None:
             raise ValueError('Parameter register_name must be of type int, str or CpuRegister enumeration.')
 
-        register_name = ctypes.c_int(register_name.value)
-        #value = ctypes.c_uint32()
-        return self.jlink.JLINKARM_ReadReg(register_name)
+        return self._ReadReg(register_name.value)
 
     def write(self, addr, data):
         """
-        Writes data from the array into the device starting at the given address.
+        Writes data from the buffer into the device starting at the given address.
         @param int addr: Start address of the memory block to write.
-        @param sequence data: Data to write. Any type that implements the sequence API (i.e. string, list, bytearray...) is valid as input.
+        @param buffer data: Data to write. Any buffer-protocol object (bytes, bytearray, memoryview...) is passed to the DLL without per-byte work, other sequences of u8 values are converted with bytes().
         """
         if not self._is_u32(addr):
             raise ValueError('The addr parameter must be an unsigned 32-bit value.')
 
-        if not self._is_valid_buf(data):
-            raise ValueError('The data parameter must be a sequence type with at least one item.')
+        try:
+            view = memoryview(data)
+        except TypeError:
+            view = memoryview(bytes(data))
+        view = view.cast('B')
+
+        data_len = len(view)
+        if data_len == 0 or addr + data_len > 0x100000000:
+            raise ValueError('The data parameter must hold at least one byte and fit in the 32-bit address space.')
 
-        addr = ctypes.c_uint32(addr)
-        data_len = ctypes.c_uint32(len(data))
-        data = (ctypes.c_uint8 * data_len.value)(*data)
-        self.jlink.JLINKARM_WriteMem(addr, data_len, ctypes.byref(data))
+        if view.readonly:
+            data = (ctypes.c_uint8 * data_len).from_buffer_copy(view)
+        else:
+            data = (ctypes.c_uint8 * data_len).from_buffer(view)
+        self._WriteMem(addr, data_len, data)
 
     def read(self, addr, data_len):
         """
@@ -304,11 +574,68 @@ class Jlink(object):
         if not self._is_u32(data_len):
             raise ValueError('The data_len parameter must be an unsigned 32-bit value.')
 
-        addr = ctypes.c_uint32(addr)
-        data_len = ctypes.c_uint32(data_len)
-        data = (ctypes.c_uint8 * data_len.value)()
-        self.jlink.JLINKARM_ReadMem(addr, data_len, ctypes.byref(data))
-        return bytes(data)
+        data = ctypes.create_string_buffer(data_len)
+        if self._ReadMem(addr, data_len, data):
+            self.read_errors += 1
+        return data.raw
+
+    def read_into(self, addr, buf, offset=0):
+        """
+        Reads device memory starting at the given address straight into buf, without any intermediate copy.
+        @param int addr: Start address of the memory block to read.
+        @param buffer buf: Writable buffer-protocol object (bytearray, memoryview, array, mmap...) to fill.
+        @param int offset: Byte offset into buf where the data is placed, the rest of buf is filled.
+        @return int: Number of bytes read.
+        """
+        if not self._is_u32(addr):
+            raise ValueError('The addr parameter must be an unsigned 32-bit value.')
+
+        view = memoryview(buf)
+        if view.readonly:
+            raise ValueError('The buf parameter must be a writable buffer.')
+        view = view.cast('B')
+
+        data_len = len(view) - offset
+        if offset < 0 or data_len < 0:
+            raise ValueError('The offset parameter must be within the buffer.')
+        if data_len == 0:
+            return 0
+
+        data = (ctypes.c_uint8 * data_len).from_buffer(view, offset)
+        if self._ReadMem(addr, data_len, data):
+            self.read_errors += 1
+        return data_len
+
+    def read_many(self, regions, gap=_DEFAULT_READ_MERGE_GAP):
+        """
+        Reads several memory regions with the fewest JLINKARM_ReadMem transfers.
+        Regions are sorted and coalesced when separated by at most gap bytes, the bytes in between are read and dropped.
+        @param [(int, int)] regions: (addr, data_len) of every region to read.
+        @param int gap: Largest hole in bytes bridged by one transfer.
+        @return [memoryview]: One view per region, in the order of regions.
+        """
+        spans = []
+        for i in sorted(range(len(regions)), key=lambda i: regions[i][0]):
+            addr, data_len = regions[i]
+            if not self._is_u32(addr):
+                raise ValueError('The region addr must be an unsigned 32-bit value.')
+            if not self._is_u32(data_len) or addr + data_len > 0x100000000:
+                raise ValueError('The region data_len must fit in the 32-bit address space.')
+
+            if spans and addr - spans[-1][1] <= gap:
+                spans[-1][1] = max(spans[-1][1], addr + data_len)
+                spans[-1][2].append(i)
+            else:
+                spans.append([addr, addr + data_len, [i]])
+
+        views = [None] * len(regions)
+        for start, end, members in spans:
+            buf = memoryview(bytearray(end - start))
+            self.read_into(start, buf)
+            for i in members:
+                addr, data_len = regions[i]
+                views[i] = buf[addr - start:addr - start + data_len]
+        return views
 
     def read_32(self, addr):
         """
@@ -319,12 +646,50 @@ class Jlink(object):
         if not self._is_u32(addr):
             raise ValueError('The addr parameter must be an unsigned 32-bit value.')
 
-        addr = ctypes.c_uint32(addr)
         data = ctypes.c_uint32()
-        status = ctypes.c_byte()
-        self.jlink.JLINKARM_ReadMemU32(addr, 1, ctypes.byref(data), ctypes.byref(status))
+        status = ctypes.c_uint8()
+        self._ReadMemU32(addr, 1, ctypes.byref(data), ctypes.byref(status))
         return data.value
 
+    def read_u32_array(self, addr, count, as_numpy=False):
+        """
+        Reads count uint32_t starting at the given address in one transfer of 32-bit accesses.
+        @param int addr: Word aligned address to read.
+        @param int count: Number of words to read.
+        @param bool as_numpy: Return numpy arrays sharing the buffers instead of array.array.
+        @return (array('I'), array('B')): Values read and per-word status, nonzero status marks a failed word.
+        """
+        return self._read_array(self._ReadMemU32, ctypes.c_uint32, _U32_TYPECODE, addr, count, as_numpy)
+
+    def read_u16_array(self, addr, count, as_numpy=False):
+        """
+        Reads count uint16_t starting at the given address in one transfer of 16-bit accesses.
+        @param int addr: Halfword aligned address to read.
+        @param int count: Number of halfwords to read.
+        @param bool as_numpy: Return numpy arrays sharing the buffers instead of array.array.
+        @return (array('H'), array('B')): Values read and per-halfword status, nonzero status marks a failed halfword.
+        """
+        return self._read_array(self._ReadMemU16, ctypes.c_uint16, _U16_TYPECODE, addr, count, as_numpy)
+
+    def _read_array(self, func, ctype, typecode, addr, count, as_numpy):
+        width = ctypes.sizeof(ctype)
+        if not self._is_u32(addr) or addr % width:
+            raise ValueError('The addr parameter must be an unsigned 32-bit value aligned to {} bytes.'.format(width))
+
+        if not self._is_u32(count) or count == 0 or addr + count * width > 0x100000000:
+            raise ValueError('The count parameter must be at least one and fit in the 32-bit address space.')
+
+        values = array(typecode, bytes(count * width))
+        status = array('B', bytes(count))
+        ret = func(addr, count, (ctype * count).from_buffer(values), (ctypes.c_uint8 * count).from_buffer(status))
+        if ret < 0:
+            raise JlinkError("Could not read {} items at 0x{:08X}: {}.".format(count, addr, ret))
+
+        if as_numpy:
+            import numpy
+            return numpy.frombuffer(values, dtype=numpy.dtype(ctype)), numpy.frombuffer(status, dtype=numpy.uint8)
+        return values, status
+
     def write_32(self, addr, data):
         """
         Writes one uint32_t data into the given address.
@@ -337,68 +702,128 @@ class Jlink(object):
         if not self._is_u32(data):
             raise ValueError('The data parameter must be an unsigned 32-bit value.')
 
-        addr = ctypes.c_uint32(addr)
-        data = ctypes.c_uint32(data)
-        self.jlink.JLINKARM_WriteU32(addr, data)
+        self._WriteU32(addr, data)
 
     def read_16(self, addr):
-        addr = ctypes.c_uint32(addr)
         data = ctypes.c_uint16()
-        status = ctypes.c_byte()
-        self.jlink.JLINKARM_ReadMemU16(addr, 1, ctypes.byref(data), ctypes.byref(status))
+        status = ctypes.c_uint8()
+        self._ReadMemU16(addr, 1, ctypes.byref(data), ctypes.byref(status))
         return data.value
 
     def write_16(self, addr, data):
-        addr = ctypes.c_uint32(addr)
-        data = ctypes.c_uint16(data)
-        self.jlink.JLINKARM_WriteU16(addr, data)
+        self._WriteU16(addr, data)
 
     def read_8(self, addr, buf, len, status):
-        addr = ctypes.c_uint32(addr)
         data = ctypes.c_uint8()
-        status = ctypes.c_byte()
-        self.jlink.JLINKARM_ReadMemU8(addr, 1, ctypes.byref(data), ctypes.byref(status))
+        status = ctypes.c_uint8()
+        self._ReadMemU8(addr, 1, ctypes.byref(data), ctypes.byref(status))
         return data.value
 
     def write_8(self, addr, data):
-        addr = ctypes.c_uint32(addr)
-        data = ctypes.c_uint8(data)
-        self.jlink.JLINKARM_WriteU8(addr, data)
+        self._WriteU8(addr, data)
+
+
+    def rtt_start(self, addr=None):
+        """
+        Starts the RTT engine of the DLL, which polls the control block on its own.
+        @param int addr: Address of the SEGGER RTT control block, None to let the DLL search for it.
+        """
+        start = _RTTerminalStart(addr or 0)
+        ret = self._RTTERMINAL_Control(JLINK_RTTERMINAL_CMD_START, ctypes.byref(start))
+        if ret < 0:
+            raise JlinkError("Could not start RTT: {}.".format(ret))
+
+    def rtt_stop(self):
+        """
+        Stops the RTT engine of the DLL.
+        """
+        self._RTTERMINAL_Control(JLINK_RTTERMINAL_CMD_STOP, None)
+
+    def rtt_get_num_buf(self, direction=JLINK_RTTERMINAL_BUFFER_DIR_UP):
+        """
+        Returns the number of up or down buffers, negative while the DLL is still searching the control block.
+        @param int direction: JLINK_RTTERMINAL_BUFFER_DIR_UP or JLINK_RTTERMINAL_BUFFER_DIR_DOWN.
+        @return int: Number of buffers.
+        """
+        direction = ctypes.c_int(direction)
+        return self._RTTERMINAL_Control(JLINK_RTTERMINAL_CMD_GETNUMBUF, ctypes.byref(direction))
+
+    def rtt_read_into(self, index, buf):
+        """
+        Reads what the DLL has received on an up buffer straight into buf.
+        @param int index: Up buffer index.
+        @param buffer buf: Writable buffer-protocol object, at most len(buf) bytes are read.
+        @return int: Number of bytes read.
+        """
+        view = memoryview(buf)
+        if view.readonly:
+            raise ValueError('The buf parameter must be a writable buffer.')
+        view = view.cast('B')
+        if len(view) == 0:
+            return 0
 
+        ret = self._RTTERMINAL_Read(index, (ctypes.c_uint8 * len(view)).from_buffer(view), len(view))
+        if ret < 0:
+            raise JlinkError("Could not read RTT up buffer {}: {}.".format(index, ret))
+        return ret
+
+    def rtt_read(self, index, size):
+        """
+        Reads up to size bytes the DLL has received on an up buffer.
+        @param int index: Up buffer index.
+        @param int size: Maximum number of bytes to read.
+        @return bytes: Data read, empty when nothing is pending.
+        """
+        buf = bytearray(size)
+        return bytes(buf[:self.rtt_read_into(index, buf)])
+
+    def rtt_write(self, index, data):
+        """
+        Queues data for a down buffer, the DLL writes what fits into the target buffer.
+        @param int index: Down buffer index.
+        @param buffer data: Data to write.
+        @return int: Number of bytes accepted.
+        """
+        view = memoryview(data).cast('B')
+        if len(view) == 0:
+            return 0
+
+        ret = self._RTTERMINAL_Write(index, (ctypes.c_uint8 * len(view)).from_buffer_copy(view), len(view))
+        if ret < 0:
+            raise JlinkError("Could not write RTT down buffer {}: {}.".format(index, ret))
+        return ret
 
     def get_hardware_verion(self):
         """
         got jlink hardware version
         :return: UInt32
         """
-        ret = self.jlink.JLINKARM_GetHardwareVersion()
+        ret = self._GetHardwareVersion()
         if ret == 0:
             raise JlinkError("Could not probe JLink hardware.")
         return ret
 
     def get_feature_string(self):
-        buffer_size = ctypes.c_uint32(255)
-        fwstr = ctypes.create_string_buffer(buffer_size.value)
-        self.jlink.JLINKARM_GetFeatureString(fwstr)
+        fwstr = ctypes.create_string_buffer(255)
+        self._GetFeatureString(fwstr)
         return fwstr.value
 
     def get_oem_string(self):
-        buffer_size = ctypes.c_uint32(255)
-        fwstr = ctypes.create_string_buffer(buffer_size.value)
-        self.jlink.JLINKARM_GetOEMString(fwstr)
+        fwstr = ctypes.create_string_buffer(255)
+        self._GetOEMString(fwstr)
         return fwstr.value
 
     def get_compile_date_time(self):
         #Text.StringBuilder JLINKARM_GetCompileDateTime()
-        return self.jlink.JLINKARM_GetCompileDateTime()
+        return self._GetCompileDateTime()
 
     def get_SN(self):
         #UInt32 JLINKARM_GetSN()
-        return self.jlink.JLINKARM_GetSN()
+        return self._GetSN()
 
     def get_ID(self):
         #UInt32 JLINKARM_GetId()
-        return self.jlink.JLINKARM_GetId()
+        return self._GetId()
 
     def _is_u32(self, value):
         return isinstance(value, int) and 0 <= value <= 0xFFFFFFFF
@@ -409,14 +834,6 @@ class Jlink(object):
     def _is_bool(self, value):
         return isinstance(value, bool) or 0 <= value <= 1
 
-    def _is_valid_buf(self, buf):
-        if buf is None:
-            return False
-        for value in buf:
-            if not self._is_u8(value):
-                return False
-        return len(buf) > 0
-
     def _is_valid_encoding(self, encoding):
         try:
             codecs.lookup(encoding)
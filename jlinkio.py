@@ -0,0 +1,99 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import jlink
+
+# command priorities, lower runs first
+# polls while an up channel is about to overflow
+PRIO_DRAIN       = -10
+PRIO_INTERACTIVE = 0
+PRIO_POLL        = 10
+_PRIO_SHUTDOWN   = 1 << 30
+
+
+class JlinkIOClosed(jlink.JlinkError):
+    """
+    Raised when a command is submitted after shutdown().
+    """
+    pass
+
+
+class JlinkIO(object):
+    """
+    Owns a Jlink handle: every DLL access runs in one I/O thread, since the DLL is not thread-safe.
+    Commands are queued by priority, then in submission order, and complete a concurrent.futures.Future.
+    """
+
+    def __init__(self, jlink):
+        self.jlink = jlink
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._closed = False
+        # priority: [commands, total wait, max wait] of the time spent queued
+        self._wait = {}
+        self._thread = threading.Thread(target=self._run, name='jlink-io', daemon=True)
+        self._thread.start()
+
+    def submit(self, func, *args, prio=PRIO_POLL):
+        """
+        Queues func(*args) for the I/O thread.
+        @param int prio: PRIO_INTERACTIVE jumps ahead of queued PRIO_POLL commands, PRIO_DRAIN ahead of both.
+        @return Future: Completes with the result or exception of func.
+        """
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise JlinkIOClosed("The J-Link I/O thread is shut down.")
+            self._queue.put((prio, next(self._seq), time.perf_counter(), future, func, args))
+        return future
+
+    def call(self, func, *args, prio=PRIO_POLL):
+        """
+        Runs func(*args) in the I/O thread and waits for its result.
+        """
+        return self.submit(func, *args, prio=prio).result()
+
+    def shutdown(self, wait=True):
+        """
+        Refuses new commands, the I/O thread exits once the queued ones are done.
+        """
+        with self._lock:
+            if not self._closed:
+                self._closed = True
+                self._queue.put((_PRIO_SHUTDOWN, next(self._seq), time.perf_counter(), None, None, None))
+        if wait and threading.current_thread() is not self._thread:
+            self._thread.join()
+
+    def wait_stats(self):
+        """
+        Returns how long commands waited in the queue before running.
+        @return {int: (int, float, float)}: Priority to (commands, mean wait s, max wait s).
+        """
+        with self._lock:
+            return {prio: (n, total / n, peak) for prio, (n, total, peak) in self._wait.items()}
+
+    def _run(self):
+        while True:
+            prio, _, queued, future, func, args = self._queue.get()
+            if future is None:
+                return
+
+            wait = time.perf_counter() - queued
+            with self._lock:
+                stat = self._wait.setdefault(prio, [0, 0.0, 0.0])
+                stat[0] += 1
+                stat[1] += wait
+                stat[2] = max(stat[2], wait)
+
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(func(*args))
+            except BaseException as e:
+                future.set_exception(e)
@@ -0,0 +1,174 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import json
+import threading
+import time
+
+# HDR-style log buckets: 2**_SUB_BITS linear sub-buckets per power of two, ~12% resolution
+_SUB_BITS = 3
+_SUB      = 1 << _SUB_BITS
+_BUCKETS  = 64 * _SUB
+
+# bytes moved by one call, from its arguments and return value
+_BYTES = {
+    'JLINKARM_ReadMem':       lambda args, ret: args[1],
+    'JLINKARM_WriteMem':      lambda args, ret: args[1],
+    'JLINKARM_ReadMemU32':    lambda args, ret: args[1] * 4,
+    'JLINKARM_ReadMemU16':    lambda args, ret: args[1] * 2,
+    'JLINKARM_ReadMemU8':     lambda args, ret: args[1],
+    'JLINKARM_WriteU32':      lambda args, ret: 4,
+    'JLINKARM_WriteU16':      lambda args, ret: 2,
+    'JLINKARM_WriteU8':       lambda args, ret: 1,
+    'JLINK_RTTERMINAL_Read':  lambda args, ret: max(ret, 0),
+    'JLINK_RTTERMINAL_Write': lambda args, ret: max(ret, 0),
+}
+
+
+def _bucket(ns):
+    shift = ns.bit_length() - _SUB_BITS - 1
+    if shift <= 0:
+        return ns
+    return shift * _SUB + (ns >> shift)
+
+
+def _bucket_low(idx):
+    if idx < 2 * _SUB:
+        return idx
+    shift = idx // _SUB - 1
+    return (idx - shift * _SUB) << shift
+
+
+class Histogram(object):
+    """
+    Latency histogram in nanoseconds with logarithmic buckets, recording is one list increment.
+    """
+
+    def __init__(self):
+        self.counts = [0] * _BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, ns):
+        self.counts[_bucket(ns)] += 1
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+
+    def percentile(self, p):
+        """
+        @return int: Lower bound in ns of the bucket holding the p-th percentile.
+        """
+        rank = self.count * p / 100.0
+        seen = 0
+        for idx, n in enumerate(self.counts):
+            seen += n
+            if n and seen >= rank:
+                return _bucket_low(idx)
+        return 0
+
+    def buckets(self):
+        """
+        @return [(int, int)]: (bucket lower bound in ns, count) of the non-empty buckets.
+        """
+        return [(_bucket_low(idx), n) for idx, n in enumerate(self.counts) if n]
+
+
+class StatsDump(object):
+    """
+    Dumps of the counters of a statistics class as JSON lines {"time", "uptime", ...}, the rest of the line being
+    its dump_record(). The class keeps the start of its counters in started.
+    """
+
+    # name of the dumping thread
+    dump_thread_name = 'stats-dump'
+    _dump_stop = None
+
+    def dump(self, path):
+        """
+        Appends one JSON line holding the current counters to path.
+        """
+        now = time.time()
+        record = {'time': now, 'uptime': now - self.started}
+        record.update(self.dump_record())
+        with open(path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+    def start_dump(self, path, interval=5.0):
+        """
+        Dumps to path every interval seconds from a daemon thread until stop_dump().
+        """
+        self.stop_dump()
+        stop = self._dump_stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval):
+                self.dump(path)
+        threading.Thread(target=run, name=self.dump_thread_name, daemon=True).start()
+
+    def stop_dump(self):
+        if self._dump_stop is not None:
+            self._dump_stop.set()
+            self._dump_stop = None
+
+
+class CallStats(object):
+    def __init__(self):
+        self.calls = 0
+        self.bytes = 0
+        self.latency = Histogram()
+
+
+class JlinkStats(StatsDump):
+    """
+    Call counts, bytes moved and latency histograms per DLL entry point, dumped as {"funcs": snapshot()}.
+    Jlink.enable_stats() wraps its bound prototypes with wrap(), disable_stats() puts the raw pointers back,
+    so nothing is measured or paid while disabled. Recording takes no lock, a snapshot from another thread may
+    be off by the call in flight.
+    """
+
+    dump_thread_name = 'jlink-stats'
+
+    def __init__(self):
+        self.funcs = {}
+        self.started = time.time()
+
+    def wrap(self, name, func):
+        stats = self.funcs.setdefault(name, CallStats())
+        nbytes = _BYTES.get(name)
+        clock = time.perf_counter_ns
+
+        def call(*args):
+            t0 = clock()
+            ret = func(*args)
+            stats.latency.record(clock() - t0)
+            stats.calls += 1
+            if nbytes is not None:
+                stats.bytes += nbytes(args, ret)
+            return ret
+        return call
+
+    def snapshot(self):
+        """
+        @return dict: Per symbol calls, bytes, mean/p50/p99/max latency in us and the histogram buckets.
+        """
+        snap = {}
+        for name, stats in self.funcs.items():
+            if not stats.calls:
+                continue
+            h = stats.latency
+            snap[name] = {
+                'calls':   stats.calls,
+                'bytes':   stats.bytes,
+                'mean_us': h.total / h.count / 1000.0,
+                'p50_us':  h.percentile(50) / 1000.0,
+                'p99_us':  h.percentile(99) / 1000.0,
+                'max_us':  h.max / 1000.0,
+                'buckets': h.buckets(),
+            }
+        return snap
+
+    def dump_record(self):
+        return {'funcs': self.snapshot()}
@@ -5,10 +5,12 @@ MASK_32 = 0xffffffff
 
 
 class RingBuffer(object):
-    def __init__(self, mem_read, mem_write, arr):
+    def __init__(self, mem_read_into, mem_write, arr):
         self.WrOff, self.RdOff, self.mask, self.esize, self.pBuffer = arr
-        self.mem_read = mem_read
+        self.mem_read_into = mem_read_into
         self.mem_write= mem_write
+        # receive buffer reused by every fifo_copy_out, allocated on first use
+        self.rx_buf = None
 
     def fifo_empty(self):
         return self.WrOff == self.RdOff
@@ -19,6 +21,12 @@ class RingBuffer(object):
     def fifo_len(self):
         return min((self.WrOff - self.RdOff) & MASK_32, self.fifo_size())
 
+    def fifo_overrun(self):
+        '''
+        return: bytes written beyond the fifo size ahead of RdOff, overwritten before they were read
+        '''
+        return max(((self.WrOff - self.RdOff) & MASK_32) - self.fifo_size(), 0)
+
     def fifo_unused(self):
         return self.mask + 1 - self.fifo_len()
 
@@ -46,15 +54,22 @@ class RingBuffer(object):
         return len(src)
 
     def fifo_copy_out(self, len, off):
+        '''
+        return: memoryview into the receive buffer, only valid until the next call
+        '''
         size = self.mask + 1
         off &= self.mask
 
         l = min(len, size - off)
 
-        # target addr, dst, len
-        d = bytearray(self.mem_read(self.pBuffer + off, l))
-        d.extend(self.mem_read(self.pBuffer, len - l))
-        return d
+        if self.rx_buf is None:
+            self.rx_buf = memoryview(bytearray(size))
+
+        # target addr, dst
+        self.mem_read_into(self.pBuffer + off, self.rx_buf[:l])
+        if len > l:
+            self.mem_read_into(self.pBuffer, self.rx_buf[l:len])
+        return self.rx_buf[:len]
 
     def fifo_out_peek(self, len):
         l = self.fifo_len()
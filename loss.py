@@ -0,0 +1,192 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+Data loss accounting per up channel: the bytes received, the data the target dropped, i.e. WrOff jumps beyond the
+buffer and, for firmware stamping its lines, sequence gaps, and the polls finding the buffer full or nearly so.
+A full buffer is back-pressure: in block mode the firmware waits and nothing is lost, in skip or trim mode it may be.
+"""
+
+import re
+import time
+from jlinkstats import StatsDump
+
+# fill fraction of an up buffer counted as near full
+NEAR_FULL = 0.9
+# longest partial line kept for the sequence numbers, a longer one is skipped
+_MAX_LINE = 4096
+
+
+def parse_sequences(spec):
+    """
+    @param str spec: Semicolon separated channel=regex items, the first group of regex matched at the start of a line
+                     being its decimal sequence number, e.g. "0=\\[(\\d+)\\]".
+    @return {int: str}: Patterns per channel.
+    """
+    patterns = {}
+    for item in filter(None, (s.strip() for s in spec.split(';'))):
+        try:
+            channel, pattern = item.split('=', 1)
+            channel = int(channel, 0)
+            valid = channel >= 0 and re.compile(pattern).groups >= 1
+        except (ValueError, re.error):
+            valid = False
+        if not valid:
+            raise ValueError("Sequence patterns must be channel=regex items with a group, not '{}'.".format(item))
+        patterns[channel] = pattern
+    return patterns
+
+
+class SequenceChecker(object):
+    """
+    Follows the sequence numbers at the start of the lines of a channel. A number skipping ahead is a gap of the
+    numbers in between, a number going back is a restart of the firmware counter, e.g. a reset or a wrap.
+    """
+
+    def __init__(self, pattern):
+        self.regex = re.compile(pattern.encode() if isinstance(pattern, str) else pattern)
+        self.expected = None
+        self.gaps = 0
+        self.missing = 0
+        self.restarts = 0
+        self._partial = b''
+
+    def feed(self, data):
+        """
+        @return [(int, int, int)]: Gaps in data as (offset of the line after the gap, first missing number,
+                                   missing count), the offset is 0 for a line that started in an earlier chunk.
+        """
+        data = bytes(data)
+        start = -len(self._partial)
+        lines = (self._partial + data).split(b'\n')
+        self._partial = lines.pop()
+        if len(self._partial) > _MAX_LINE:
+            self._partial = b''
+        gaps = []
+        for line in lines:
+            offset = max(start, 0)
+            start += len(line) + 1
+            m = self.regex.match(line)
+            if m is None:
+                continue
+            try:
+                n = int(m.group(1))
+            except ValueError:
+                continue
+            if self.expected is not None and n != self.expected:
+                if n > self.expected:
+                    self.gaps += 1
+                    self.missing += n - self.expected
+                    gaps.append((offset, self.expected, n - self.expected))
+                else:
+                    self.restarts += 1
+            self.expected = n + 1
+        return gaps
+
+
+class ChannelLoss(object):
+    def __init__(self, index, sequence=None):
+        self.index = index
+        self.sequence = SequenceChecker(sequence) if sequence is not None else None
+        # bytes received, polls, polls finding the buffer full or near full, WrOff jumps beyond the buffer and the
+        # bytes they overwrote
+        self.received = 0
+        self.polls = 0
+        self.full_polls = 0
+        self.near_full_polls = 0
+        self.overruns = 0
+        self.overrun_bytes = 0
+
+    def stats(self):
+        stats = {'received': self.received, 'polls': self.polls, 'full_polls': self.full_polls,
+                 'near_full_polls': self.near_full_polls, 'overruns': self.overruns,
+                 'overrun_bytes': self.overrun_bytes}
+        if self.sequence is not None:
+            stats.update({'seq_gaps': self.sequence.gaps, 'seq_missing': self.sequence.missing,
+                          'seq_restarts': self.sequence.restarts})
+        return stats
+
+
+class LossMonitor(StatsDump):
+    """
+    Accounts every poll of a backend, in the thread polling it, and marks each gap in the data of its channel.
+    stats() may be called from any thread, like jlinkstats it takes no lock and may be off by the poll in flight.
+    Dumped as {"channels": stats()}.
+    """
+
+    dump_thread_name = 'rtt-loss-stats'
+
+    def __init__(self, sequences=None, near_full=NEAR_FULL):
+        """
+        @param {int: str} sequences: Sequence number patterns per channel, see parse_sequences().
+        """
+        self.sequences = dict(sequences or {})
+        self.near_full = near_full
+        self.channels = {}
+        self.started = time.time()
+
+    def channel(self, index):
+        channel = self.channels.get(index)
+        if channel is None:
+            channel = self.channels[index] = ChannelLoss(index, self.sequences.get(index))
+        return channel
+
+    def account(self, chunks, fill=(), overrun=()):
+        """
+        @param [bytearray] chunks: Data received per up channel.
+        @param [(int, int)] fill: (pending bytes, size) per up channel as the poll found them, empty if unknown.
+        @param [int] overrun: Bytes overwritten per up channel before the poll could read them, empty if unknown.
+        @return [bytearray]: chunks with a gap marker where data was lost: ahead of the data following an overrun,
+                             ahead of the line following a sequence gap.
+        """
+        marked = list(chunks)
+        for index in range(max(len(chunks), len(fill), len(overrun))):
+            channel = self.channel(index)
+            channel.polls += 1
+            if index < len(fill):
+                pending, size = fill[index]
+                # one byte of a SEGGER buffer always stays free
+                if size and pending >= size - 1:
+                    channel.full_polls += 1
+                if size and pending >= self.near_full * size:
+                    channel.near_full_polls += 1
+            if index >= len(chunks):
+                continue
+            data = chunks[index]
+            channel.received += len(data)
+            markers = []
+            if index < len(overrun) and overrun[index]:
+                channel.overruns += 1
+                channel.overrun_bytes += overrun[index]
+                markers.append((0, u"\n---- 数据丢失: 目标覆盖了未读取的 {} B ----\n".format(overrun[index])))
+            if channel.sequence is not None and data:
+                for offset, first, missing in channel.sequence.feed(data):
+                    markers.append((offset, u"\n---- 数据丢失: 缺少序号 {} 起 {} 个 ----\n".format(first, missing)))
+            if markers:
+                out = bytearray()
+                pos = 0
+                for offset, text in markers:
+                    out += data[pos:offset]
+                    out += text.encode()
+                    pos = offset
+                out += data[pos:]
+                marked[index] = out
+        return marked
+
+    def totals(self):
+        """
+        @return (int, int, int): Overwritten bytes, missing sequence numbers and polls finding a buffer full, over
+                                 all channels.
+        """
+        channels = list(self.channels.values())
+        lost = sum(c.overrun_bytes for c in channels)
+        missing = sum(c.sequence.missing for c in channels if c.sequence is not None)
+        return lost, missing, sum(c.full_polls for c in channels)
+
+    def stats(self):
+        """
+        @return {int: dict}: Counters per up channel, see ChannelLoss.stats().
+        """
+        return {index: channel.stats() for index, channel in list(self.channels.items())}
+
+    def dump_record(self):
+        return {'channels': self.stats()}
@@ -3,39 +3,105 @@
 
 import os, sys
 from Ui import ui_MainWindow
+from Ui.StatsDialog import StatsDialog
 from PyQt5.QtWidgets import QApplication, QMainWindow, QFontDialog, QFileDialog, QMessageBox
 from PyQt5 import QtCore, QtGui, QtWidgets
-import struct
 import threading, time
 import jlink
-from kfifo import *
+import jlinkio
+import autotune
+import replay
+import rtt
+import session
+import discover
+import elf
+import demux
+import loss
+import scheduler
 
 COTEX_RAM_BASE = 0x20000000
-RTT_TAG        = "SEGGER RTT"
+# boot alias of the vector table, constant while the firmware runs
+COTEX_VECTOR_BASE = 0x00000000
+# while the target is not back after a reset, the RAM is scanned again at most this often, in s
+REATTACH_SCAN_INTERVAL = 0.5
 
 if getattr(sys, 'frozen', False): # we are running in a |PyInstaller| bundle
     basedir = sys._MEIPASS
 else: # we are running in a normal Python environment
     basedir = os.path.dirname(__file__)
 
-jlinkdllpath = os.path.join(basedir, "JLink_x64.dll")
+# JLINK_DLL_PATH, else the DLL bundled next to the console, else the newest SEGGER installation (see jlink.find_latest_dll)
+jlinkdllpath = os.environ.get(jlink.JLINK_DLL_ENV) or os.path.join(basedir, "JLink_x64.dll")
+if not os.path.exists(jlinkdllpath):
+    jlinkdllpath = None
+# opt-in DLL call statistics, dumped as JSON lines to this file every 5 s
+jlinkstatspath = os.environ.get("RTT_CONSOLE_STATS")
+# opt-in trace of the acquisition DLL calls for replay.py, a file stamped with the time per Start, see replay.trace_path
+jlinktracepath = os.environ.get("RTT_CONSOLE_RECORD")
+# RAM searched for the RTT control block: a discover.RAM_REGIONS preset or start:size pairs
+ramregions = discover.parse_regions(os.environ.get("RTT_CONSOLE_RAM", discover.DEFAULT_RAM_REGIONS))
+# firmware ELF whose _SEGGER_RTT symbol locates the control block, can be changed from the file menu
+elfpath = os.environ.get("RTT_CONSOLE_ELF")
+# sinks of the RTT up channels other than the views, e.g. "1=file:telemetry.bin;2=tcp:19021", see demux.parse_sinks
+channelsinks = demux.parse_sinks(os.environ.get("RTT_CONSOLE_SINKS", ""))
+# min:max delay between polls in ms, adapted to the data flow in between
+pollintervals = scheduler.parse_intervals(os.environ.get("RTT_CONSOLE_POLL_MS", "1:100"))
+# fill level in % an up buffer must not reach, polls speed up as it is predicted to
+highwatermark = scheduler.parse_watermark(os.environ.get("RTT_CONSOLE_WATERMARK",
+                                                       str(scheduler.DEFAULT_HIGH_WATERMARK * 100)))
+# SWD clock in kHz while an up buffer cannot be kept below the watermark, else the fastest one tuned this session
+boostspeed = autotune.parse_speed(os.environ.get("RTT_CONSOLE_BOOST_KHZ", "0"))
+# sequence numbers stamped at the start of the lines of a channel, e.g. "0=\[(\d+)\]", see loss.parse_sequences
+sequencepatterns = loss.parse_sequences(os.environ.get("RTT_CONSOLE_SEQ", ""))
+# opt-in data loss counters per channel, dumped as JSON lines to this file every 5 s
+lossstatspath = os.environ.get("RTT_CONSOLE_LOSS_STATS")
 
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.uiInit()
         self.action_init()
+        self.elfpath = elfpath
+        self.ui.actionElf.setChecked(bool(elfpath))
+        self.session = None
         self.jlink   = None
+        self.scanner = None
+        self.located = None
+        self.reset_at = None
+        self.reset_reason = None
+        self.rescan_due = 0
+        self.reattach_time = None
         self.RTT_addr = None
-        self.aUp     = None
-        self.aDown   = None
+        self.rtt     = None
+        self.io      = None
+        self.demux   = None
+        self.loss    = None
+        # loss.LossMonitor.totals() at the last status bar update
+        self.lossTotals = (0, 0, 0)
+        self.statsDialog = None
+        self.scheduler = None
+        self.tuner   = None
+        self.boost   = None
+        self.recorder = None
         self.closed  = False
-        threading.Thread(target=self.serial_recv).start()
+        # backend whose poll failed, no longer polled while the UI thread stops the acquisition
+        self.failed  = None
+        self.recv_thread = threading.Thread(target=self.serial_recv)
+        self.recv_thread.start()
 
     def uiInit(self):
         self.ui = ui_MainWindow.Ui_MainWindow()
         self.ui.setupUi(self)
         self.ui.plainTextEdit.document().setMaximumBlockCount(1000)
+        # read-only views of the up channels, created on their first data
+        self.views = {0: self.ui.plainTextEdit}
+
+        self.pollLbl = QtWidgets.QLabel()
+        self.pollLbl.setToolTip(u"轮询频率, 最近一秒目标缓冲区最高水位")
+        self.ui.statusbar.addPermanentWidget(self.pollLbl)
+        self.pollTimer = QtCore.QTimer(self)
+        self.pollTimer.timeout.connect(self.on_poll_timer)
+        self.pollTimer.start(1000)
 
         self.lineLbl = QtWidgets.QLabel()
         self.lineLbl.setToolTip(u"行数")
@@ -47,7 +113,16 @@ class MainWindow(QMainWindow):
         self.ui.actionFont.triggered.connect(self.on_btn_font_clicked)
         self.ui.actionClear.triggered.connect(self.on_btn_clear_clicked)
         self.ui.actionSave.triggered.connect(self.onBtnSaveClicked)
+        self.ui.actionElf.triggered.connect(self.on_btn_elf_clicked)
         self.ui.actionAbout.triggered.connect(self.about)
+        # one acquisition backend at a time
+        self.backendGroup = QtWidgets.QActionGroup(self)
+        self.backendGroup.setExclusive(True)
+        for action in (self.ui.actionKfifoRTT, self.ui.actionNativeRTT, self.ui.actionSeggerRTT):
+            self.backendGroup.addAction(action)
+        self.backendGroup.triggered.connect(self.on_setting_toggled)
+        self.ui.actionAutoSpeed.toggled.connect(self.on_setting_toggled)
+        self.ui.actionStats.triggered.connect(self.on_btn_stats_clicked)
         self.ui.plainTextEdit.signal_key.connect(self.on_text_edit_key_pressed)
 
     def about(self):
@@ -55,46 +130,140 @@ class MainWindow(QMainWindow):
                           "Version 1.1 build at 20170419<br/>"
                           "Copyright @ dudulung<br/>")
 
-    def get_RTT_addr(self):
-        idx = 0
-        while idx < (20*1024):
-            data = self.jlink.read(COTEX_RAM_BASE + idx, 0x80)
-            addr = data.find(RTT_TAG.encode())
-            if addr >= 0:
-                return COTEX_RAM_BASE + idx + addr
-            idx += 0x80-16
-        return COTEX_RAM_BASE
-
-    def mem_read(self, addr, data_len):
-        return self.jlink.read(addr, data_len)
-
-    def mem_write(self, addr, data):
-        self.jlink.write(addr, data)
-
-    def setup_ring_buffer(self):
-        """
-        struct __kfifo
-        {
-            unsigned int	in;
-            unsigned int	out;
-            unsigned int	mask;
-            unsigned int	esize;
-            void		*data;
-        };
-        typedef struct
-        {
-            char   acID[16];                                                       
-            struct __kfifo fifo_up;
-            struct __kfifo fifo_down;
-            uint8_t mode_up;
-            uint8_t mode_down; 
-        } SEGGER_RTT_CB;
-        """
-        LEN = (4 * 5) * 2
-        data = self.jlink.read(self.RTT_addr + 16, LEN)
-        arr = struct.unpack('10L', data)
-        self.aUp   = RingBuffer(self.mem_read, self.mem_write, arr[0:5])
-        self.aDown = RingBuffer(self.mem_read, self.mem_write, arr[5:10])
+    def attach(self, backend, autospeed):
+        """
+        Runs in the J-Link I/O thread: connects the probe session and starts the RTT backend.
+        """
+        self.RTT_addr = self.session.connect(self.scan_RTT_addr, autospeed, self.elf_RTT_addr, backend)
+        self.tuner = self.session.tuner
+        normal = self.tuner.speed if self.tuner is not None else self.session.speed
+        boost = boostspeed
+        if not boost and self.tuner is not None:
+            boost = max(self.tuner.results, default=0)
+        self.boost = autotune.SpeedBoost(self.jlink, normal, boost) if boost > normal else None
+        if jlinktracepath:
+            self.recorder = replay.record(self.jlink, replay.trace_path(jlinktracepath),
+                                          {'backend': backend, 'addr': self.RTT_addr})
+        backend = rtt.BACKENDS[backend](self.jlink, self.RTT_addr)
+        backend.start()
+        self.rtt = backend
+
+    def elf_RTT_addr(self):
+        """
+        Runs in the J-Link I/O thread: the _SEGGER_RTT address of the ELF, None without one.
+        The session uses it if it holds the control block, before its cached address and a RAM scan.
+        """
+        if not self.elfpath:
+            return None
+        addr = elf.symbol_address(self.elfpath)
+        self.located = u"ELF符号 0x{:08X}".format(addr)
+        return addr
+
+    def scan_RTT_addr(self):
+        """
+        Runs in the J-Link I/O thread: searches the RAM regions for the control block.
+        """
+        addr = self.scanner.scan()
+        self.located = u"扫描 {}".format(self.scanner.report())
+        return addr
+
+    def detach(self):
+        """
+        Queues the RTT backend stop and the probe close behind the pending commands, then waits for the I/O thread.
+        The DLL stays loaded for the next Start.
+        """
+        io, self.io = self.io, None
+        io.submit(self.rtt.stop)
+        io.submit(self.session.disconnect)
+        io.shutdown()
+        self.demux.close()
+        self.demux = None
+        # the counters stay readable in the stats dialog until the next Start
+        if lossstatspath:
+            self.loss.stop_dump()
+            self.loss.dump(lossstatspath)
+        if self.recorder is not None:
+            self.recorder.detach(self.jlink)
+            self.recorder = None
+        if self.jlink.stats is not None:
+            self.jlink.stats.stop_dump()
+            self.jlink.stats.dump(jlinkstatspath)
+        self.rtt = None
+        self.tuner = None
+        self.boost = None
+        self.reset_at = None
+
+    def poll(self, backend):
+        """
+        Runs in the J-Link I/O thread: drains every up channel into the demultiplexer with a gap marker in the data
+        of a channel wherever it lost some, re-attaches after a target reset, raises the SWD speed while a channel is about to
+        overflow and tunes it again after repeated read errors.
+        """
+        if self.reset_at is not None:
+            self.scheduler.update(0)
+            self.reattach(backend)
+            return
+        try:
+            chunks = backend.read_all()
+            received = sum(len(b) for b in chunks)
+            self.demux.feed(self.loss.account(chunks, backend.fill, backend.overrun))
+            self.scheduler.update(received, backend.fill, written=backend.written)
+            if self.boost is not None:
+                self.boost.update(self.scheduler.pressure)
+            if not received and self.scheduler.state_check_due():
+                self.scheduler.set_running(bool(self.jlink.is_connected()) and not self.jlink.is_halted())
+        except rtt.TargetReset as e:
+            self.reset_at = time.perf_counter()
+            self.reset_reason = str(e)
+            self.rescan_due = 0
+            backend.stop()
+            self.reattach(backend)
+            return
+        if self.tuner is not None and self.tuner.check() and self.boost is not None:
+            self.boost.reset(self.tuner.speed)
+
+    def reattach(self, backend):
+        """
+        Runs in the J-Link I/O thread: looks for the control block after a target reset and restarts the backend.
+        The last address is checked on every poll, the RAM scanned at most every REATTACH_SCAN_INTERVAL s.
+        Once re-attached, a gap marker goes to channel 0.
+        """
+        now = time.perf_counter()
+        if not self.session.is_control_block(self.RTT_addr):
+            if now < self.rescan_due:
+                return
+            self.rescan_due = now + REATTACH_SCAN_INTERVAL
+        try:
+            self.RTT_addr = self.session.relocate(self.scan_RTT_addr, self.elf_RTT_addr)
+            backend.RTT_addr = self.RTT_addr
+            backend.start()
+        except jlink.JlinkError:
+            return
+        self.reattach_time = time.perf_counter() - self.reset_at
+        self.reset_at = None
+        marker = u"\n---- 目标复位, {:.0f} ms 后重新连接 0x{:08X} ({}) ----\n".format(
+            self.reattach_time * 1000, self.RTT_addr, self.reset_reason)
+        self.demux.put(0, bytearray(marker.encode()))
+
+    def rtt_backend(self):
+        if self.ui.actionNativeRTT.isChecked():
+            return 'native'
+        return 'segger' if self.ui.actionSeggerRTT.isChecked() else 'kfifo'
+
+    def on_setting_toggled(self, checked):
+        if self.io is not None:
+            self.ui.statusbar.showMessage(u"重新开启监控后生效")
+
+    def on_btn_elf_clicked(self, checked):
+        if checked:
+            fname, ftype = QFileDialog.getOpenFileName(self, u"请选择固件ELF文件", ".", "ELF Files(*.elf *.axf *.out);;All Files(*)")
+            self.elfpath = fname or None
+            self.ui.actionElf.setChecked(bool(fname))
+        else:
+            self.elfpath = None
+        if self.session is not None:
+            self.session.forget()
+        self.on_setting_toggled(checked)
 
     def on_btn_font_clicked(self):
         font, ok = QFontDialog.getFont(self)
@@ -114,85 +283,197 @@ class MainWindow(QMainWindow):
     def on_btn_start_clicked(self):
         if self.ui.actionStart.text() == u'Start':
             try:
-                self.jlink = jlink.Jlink(jlinkdllpath)
-                self.jlink.get_hardware_verion()
-                self.jlink.set_mode(jlink.JLINK_MODE_SWD)
-                self.jlink.set_speed(4000)
-                self.RTT_addr = self.get_RTT_addr()
-                self.setup_ring_buffer()
-                self.ui.statusbar.showMessage(u"开启监控成功")
+                if self.session is None:
+                    self.jlink = jlink.Jlink(jlinkdllpath)
+                    self.session = session.JlinkSession(self.jlink, COTEX_VECTOR_BASE)
+                    self.scanner = discover.ControlBlockScanner(self.jlink, ramregions)
+                if jlinkstatspath:
+                    self.jlink.enable_stats().start_dump(jlinkstatspath)
+                self.scheduler = scheduler.PollScheduler(*pollintervals, high_watermark=highwatermark)
+                self.loss = loss.LossMonitor(sequencepatterns)
+                self.lossTotals = (0, 0, 0)
+                self.demux = demux.Demux({channel: [demux.make_sink(kind, arg) for kind, arg in sinks]
+                                          for channel, sinks in channelsinks.items()}, self.view_sinks)
+                io = jlinkio.JlinkIO(self.jlink)
+                try:
+                    io.call(self.attach, self.rtt_backend(), self.ui.actionAutoSpeed.isChecked())
+                finally:
+                    if self.rtt is None:
+                        io.submit(self.session.disconnect)
+                        io.shutdown()
+                        self.demux.close()
+                        self.demux = None
+                        if self.jlink.stats is not None:
+                            self.jlink.stats.stop_dump()
+                        if self.recorder is not None:
+                            self.recorder.detach(self.jlink)
+                            self.recorder = None
+                self.io = io
+                if lossstatspath:
+                    self.loss.start_dump(lossstatspath)
+                msg = u"开启监控成功, 连接耗时 {:.0f} ms".format(self.session.connect_time * 1000)
+                if self.session.located_by == 'cache':
+                    msg += u", 控制块缓存命中 0x{:08X}, 跳过扫描 (命中 {} 次)".format(self.RTT_addr, self.session.cache_hits)
+                elif self.session.located_by in ('symbol', 'scan'):
+                    msg += u", 控制块 {}".format(self.located)
+                self.ui.statusbar.showMessage(msg)
                 self.ui.actionStart.setText(u'Stop')
             except jlink.JlinkError as e:
                 QMessageBox.critical(self, u"错误", u"'{}'.".format(e))
                 #self.on_btn_dll_clicked()
-                del self.jlink
-                self.jlink = None
             except Exception as e:
                 print(e)
                 self.ui.statusbar.showMessage(u"开启监控失败")
         else:
             self.ui.actionStart.setText(u'Start')
-            time.sleep(0.1)
-            self.jlink.close()
-            del self.jlink
-            self.jlink = None
+            self.detach()
             self.ui.statusbar.showMessage(u"关闭监控成功")
 
-    def update_ring_buffer(self):
-        self.aUp.WrOff   = self.jlink.read_32(self.RTT_addr + 16 + (4 * 5) * 0 + 4 * 0)
-        self.aUp.RdOff   = self.jlink.read_32(self.RTT_addr + 16 + (4 * 5) * 0 + 4 * 1)
-        self.aUp.pBuffer = self.jlink.read_32(self.RTT_addr + 16 + (4 * 5) * 0 + 4 * 4)
-        self.aDown.RdOff = self.jlink.read_32(self.RTT_addr + 16 + (4 * 5) * 1 + 4 * 1)
-
-    def chn_down_full(self):
-        return self.aDown.fifo_full()
-
-    def chn_up_empty(self):
-        return self.aUp.fifo_empty()
-
-    def chn_up_read(self):
-        len = self.aUp.fifo_len()
-        b   = self.aUp.fifo_out(len)
-        self.jlink.write_32(self.RTT_addr + 16 + (4 * 5) * 0 + 4, self.aUp.RdOff)
-        return b
-
     def on_text_edit_key_pressed(self, keyarr):
         # do not response key event while jlink closed
-        if self.jlink is None or not self.jlink.is_open():
+        if self.io is None:
             self.ui.statusbar.showMessage(u"请点击start开启监控")
             return
 
-        if not self.aDown.fifo_full():
-            #print(keyarr)
-            self.aDown.fifo_in(bytes(keyarr))
-            self.jlink.write_32(self.RTT_addr + 16 + (4 * 5) * 1 + 0, self.aDown.WrOff)
+        # keystrokes jump ahead of the queued poll reads
+        self.io.submit(self.rtt.write, 0, bytes(keyarr), prio=jlinkio.PRIO_INTERACTIVE)
+
+    def view_sinks(self, channel):
+        """
+        Default sinks of a channel: its view, fed through the received signal from the channel thread. What the GUI
+        thread did not show yet is bounded like the channel queue, the channel drops and counts the data beyond.
+        """
+        sink = demux.ViewSink(lambda data: self.received.emit(channel, bytearray(data), sink))
+        return [sink]
 
-    received = QtCore.pyqtSignal(bytearray)
+    received = QtCore.pyqtSignal(int, bytearray, object)
+    failed_signal = QtCore.pyqtSignal(object, str)
     def serial_recv(self):
         self.received.connect(self.on_received)
+        self.failed_signal.connect(self.on_acquisition_failed)
 
         while not self.closed:
-            if self.ui.actionStart.text() == u'Stop':
-                self.update_ring_buffer()
-                if not self.chn_up_empty():
-                    self.received.emit(self.chn_up_read())
+            io, backend, sched = self.io, self.rtt, self.scheduler
+            if io is not None and backend is not None and backend is not self.failed:
+                try:
+                    # a channel about to overflow is drained ahead of queued commands
+                    prio = jlinkio.PRIO_DRAIN if sched.pressure else jlinkio.PRIO_POLL
+                    io.call(self.poll, backend, prio=prio)
+                except jlinkio.JlinkIOClosed:
+                    pass
+                except jlink.JlinkError as e:
+                    # a poll queued behind the stop of detach() fails on the closed probe, that is no failure
+                    if io is self.io:
+                        print("RTT acquisition failed: '{}'.".format(e))
+                        self.failed = backend
+                        self.failed_signal.emit(backend, str(e))
+                time.sleep(sched.interval)
+            else:
+                time.sleep(0.01)
 
-            time.sleep(0.01)
+    def on_acquisition_failed(self, backend, reason):
+        """
+        Stops the acquisition after a poll of backend failed, the probe is closed and the next Start connects again.
+        A failure of an acquisition already stopped, e.g. by Stop and maybe a new Start since, is ignored.
+        """
+        if backend is not self.rtt:
+            return
+        if self.io is not None:
+            self.ui.actionStart.setText(u'Start')
+            self.detach()
+        self.ui.statusbar.showMessage(u"监控已停止: {}".format(reason))
+        QMessageBox.critical(self, u"错误", u"数据采集失败, 监控已停止: '{}'.".format(reason))
+
+    def channel_stats(self):
+        """
+        Counters per up channel of the last Start, safe from any thread: the demux.Channel.stats() queue counters,
+        the loss.ChannelLoss.stats() data loss counters, and the watermark hits and lost byte estimate of the
+        overflow predictor.
+        @return {int: dict}: Counters per channel.
+        """
+        stats = {}
+        demuxer = self.demux
+        if demuxer is not None:
+            for index, counters in demuxer.stats().items():
+                stats.setdefault(index, {}).update(counters)
+        if self.loss is not None:
+            for index, counters in self.loss.stats().items():
+                stats.setdefault(index, {}).update(counters)
+        if self.scheduler is not None:
+            predictor = self.scheduler.predictor
+            for index, (hits, lost) in enumerate(zip(list(predictor.hits), list(predictor.lost))):
+                stats.setdefault(index, {}).update(watermark_hits=hits, lost_estimate=int(lost))
+        return stats
+
+    def on_btn_stats_clicked(self):
+        if self.statsDialog is None:
+            self.statsDialog = StatsDialog(self)
+        self.statsDialog.update_stats(self.channel_stats())
+        self.statsDialog.show()
+        self.statsDialog.raise_()
 
-    def on_received(self, bytesUp):
+    def on_poll_timer(self):
+        if self.statsDialog is not None and self.statsDialog.isVisible():
+            self.statsDialog.update_stats(self.channel_stats())
+        sched = self.scheduler
+        if self.io is None or sched is None:
+            self.pollLbl.setText("")
+            return
+        text = u"轮询 {:.0f} Hz, 最高水位 {:.0f}%".format(sched.poll_rate, max(sched.fill_peaks, default=0.0) * 100)
+        hits = sum(sched.predictor.hits)
+        if hits:
+            text += u", 超过警戒水位 {} 次, 估计丢失 {} B".format(hits, int(sum(sched.predictor.lost)))
+        if self.boost is not None and self.boost.boosted:
+            text += u", SWD 提速至 {} kHz".format(self.boost.boost)
+        tuner = self.tuner
+        if tuner is not None and tuner.last_error is not None:
+            text += u", SWD速率调整失败, 降至 {} kHz".format(tuner.speed)
+        waits = self.io.wait_stats().get(jlinkio.PRIO_INTERACTIVE)
+        if waits is not None:
+            text += u", 按键等待 平均 {:.1f} ms 最长 {:.1f} ms".format(waits[1] * 1000, waits[2] * 1000)
+        if self.loss is not None:
+            totals = self.loss.totals()
+            lost, missing, full = (now - last for now, last in zip(totals, self.lossTotals))
+            self.lossTotals = totals
+            if lost or missing:
+                text += u", 数据丢失 {} B / {} 个序号".format(lost, missing)
+            if full:
+                text += u", 缓冲区满 {} 次 (背压)".format(full)
+        self.pollLbl.setText(text)
+        sched.reset_peaks()
+
+    def on_received(self, channel, bytesUp, sink):
         try:
-            self.ui.plainTextEdit.moveCursor(QtGui.QTextCursor.End)
-            self.ui.plainTextEdit.insertPlainText(bytesUp.decode())
-            self.ui.plainTextEdit.moveCursor(QtGui.QTextCursor.End)
-            self.lineLbl.setText(str(self.ui.plainTextEdit.document().lineCount()))
-        except Exception as e:
-            QMessageBox.critical(self, u"错误", str(e))
+            if channel != 0:
+                self.on_channel_received(channel, bytesUp)
+                return
+            try:
+                self.ui.plainTextEdit.moveCursor(QtGui.QTextCursor.End)
+                self.ui.plainTextEdit.insertPlainText(bytesUp.decode())
+                self.ui.plainTextEdit.moveCursor(QtGui.QTextCursor.End)
+                self.lineLbl.setText(str(self.ui.plainTextEdit.document().lineCount()))
+            except Exception as e:
+                QMessageBox.critical(self, u"错误", str(e))
+        finally:
+            sink.done(len(bytesUp))
+
+    def on_channel_received(self, channel, data):
+        view = self.views.get(channel)
+        if view is None:
+            view = self.views[channel] = QtWidgets.QPlainTextEdit()
+            view.setReadOnly(True)
+            view.setFont(self.ui.plainTextEdit.font())
+            view.document().setMaximumBlockCount(1000)
+            self.ui.tabWidget.addTab(view, u"通道 {}".format(channel))
+        view.moveCursor(QtGui.QTextCursor.End)
+        view.insertPlainText(data.decode(errors='replace'))
+        view.moveCursor(QtGui.QTextCursor.End)
 
     def closeEvent(self, evt):
         self.closed = True
-        time.sleep(0.1)
-        if self.jlink and self.jlink.is_open():
-            self.jlink.close()
+        self.recv_thread.join()
+        if self.io is not None:
+            self.detach()
 
 if __name__ == '__main__':
     app = QApplication(sys.argv)
@@ -0,0 +1,292 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+Record-and-replay of the J-Link DLL calls.
+
+TraceRecorder logs every call a Jlink makes into a compact binary trace, ReplayDll plays a trace back as a stub
+library, so replay_jlink() returns a Jlink that behaves like the recorded probe with no probe attached.
+
+    python replay.py TRACE [--backend kfifo|native] [--addr ADDR] [--realtime] [--strict]
+"""
+
+import argparse
+import ctypes
+import json
+import os
+import struct
+import time
+import jlink
+
+_MAGIC = b'RTTREC1\n'
+_RECORD = struct.Struct('<HdB')
+_INT = struct.Struct('<q')
+_LEN = struct.Struct('<I')
+_OUT = struct.Struct('<BI')
+
+# buffers the DLL fills: symbol -> ((arg index, size from (args, ret) or None for the whole object), ...)
+_OUTPUTS = {
+    'JLINKARM_ReadMem':          ((2, lambda args, ret: args[1]),),
+    'JLINKARM_ReadMemU32':       ((2, lambda args, ret: args[1] * 4), (3, lambda args, ret: args[1])),
+    'JLINKARM_ReadMemU16':       ((2, lambda args, ret: args[1] * 2), (3, lambda args, ret: args[1])),
+    'JLINKARM_ReadMemU8':        ((2, lambda args, ret: args[1]), (3, lambda args, ret: args[1])),
+    'JLINKARM_GetFeatureString': ((0, None),),
+    'JLINKARM_GetOEMString':     ((0, None),),
+    'JLINK_RTTERMINAL_Read':     ((1, lambda args, ret: max(ret, 0)),),
+    'JLINK_RTTERMINAL_Control':  ((1, None),),
+}
+
+
+class ReplayError(jlink.JlinkError):
+    """
+    The replayed code made a call the trace does not hold at this point.
+    """
+    pass
+
+
+class ReplayEnd(ReplayError):
+    """
+    Every call of the trace has been replayed.
+    """
+    pass
+
+
+def _pack_value(value):
+    if value is None:
+        return b'N'
+    if isinstance(value, int):
+        return b'I' + _INT.pack(value)
+    if isinstance(value, bytes):
+        return b'B' + _LEN.pack(len(value)) + value
+    # pointers into the caller's memory, only the outputs are worth keeping
+    return b'N'
+
+
+def _unpack_value(data, pos):
+    tag = data[pos:pos + 1]
+    pos += 1
+    if tag == b'I':
+        return _INT.unpack_from(data, pos)[0], pos + _INT.size
+    if tag == b'B':
+        l, = _LEN.unpack_from(data, pos)
+        pos += _LEN.size
+        return bytes(data[pos:pos + l]), pos + l
+    return None, pos
+
+
+def _address(arg):
+    if isinstance(arg, int):
+        return arg
+    # ctypes.byref() result
+    obj = getattr(arg, '_obj', arg)
+    return ctypes.addressof(obj)
+
+
+def _whole_size(arg):
+    return ctypes.sizeof(getattr(arg, '_obj', arg))
+
+
+class TraceRecorder(object):
+    """
+    Records every DLL call of a Jlink: symbol, time since start, integer arguments, return value and output buffers.
+    """
+
+    def __init__(self, path, meta=None):
+        """
+        @param dict meta: JSON-serializable session details stored in the header, e.g. backend and control block address.
+        """
+        self.file = open(path, 'wb')
+        names = [name for name, restype, argtypes in jlink._PROTOTYPES]
+        self.index = {name: i for i, name in enumerate(names)}
+        meta = json.dumps(meta or {}).encode()
+        self.file.write(_MAGIC + _LEN.pack(len(meta)) + meta + struct.pack('<H', len(names)))
+        for name in names:
+            self.file.write(struct.pack('<B', len(name)) + name.encode())
+        self.t0 = time.perf_counter()
+
+    def attach(self, j):
+        j.add_call_wrapper(self.wrap)
+
+    def detach(self, j):
+        j.remove_call_wrapper(self.wrap)
+        self.close()
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+    def wrap(self, name, func):
+        index = self.index[name]
+        outputs = _OUTPUTS.get(name, ())
+
+        def call(*args):
+            t = time.perf_counter() - self.t0
+            ret = func(*args)
+            record = [_RECORD.pack(index, t, len(args))]
+            record.extend(_pack_value(arg) for arg in args)
+            record.append(_pack_value(ret))
+            outs = [(i, size) for i, size in outputs if args[i] is not None]
+            record.append(struct.pack('<B', len(outs)))
+            for i, size in outs:
+                n = _whole_size(args[i]) if size is None else size(args, ret)
+                record.append(_OUT.pack(i, n) + ctypes.string_at(_address(args[i]), n))
+            self.file.write(b''.join(record))
+            return ret
+        return call
+
+
+class ReplayDll(object):
+    """
+    Stub library answering the calls of a trace in order, usable with bind_prototypes() like the real DLL.
+    """
+
+    def __init__(self, path, realtime=False, strict=True):
+        """
+        @param bool realtime: Delay every call to its recorded time, otherwise replay as fast as possible.
+        @param bool strict: Raise ReplayError on any call or integer argument differing from the trace,
+                            otherwise skip recorded calls until one of the same function, e.g. interleaved keystrokes.
+        """
+        with open(path, 'rb') as f:
+            data = memoryview(f.read())
+        if bytes(data[:len(_MAGIC)]) != _MAGIC:
+            raise ReplayError("{} is not an RTT-Console trace.".format(path))
+
+        pos = len(_MAGIC)
+        l, = _LEN.unpack_from(data, pos)
+        self.meta = json.loads(bytes(data[pos + _LEN.size:pos + _LEN.size + l]).decode())
+        pos += _LEN.size + l
+        count, = struct.unpack_from('<H', data, pos)
+        pos += 2
+        self.names = []
+        for _ in range(count):
+            l = data[pos]
+            self.names.append(bytes(data[pos + 1:pos + 1 + l]).decode())
+            pos += 1 + l
+
+        self.data = data
+        self.pos = pos
+        self.calls = 0
+        self.realtime = realtime
+        self.strict = strict
+        self.t0 = None
+        self.skipped = 0
+        self._ret = None
+
+    def __getattr__(self, name):
+        if name.startswith('_') or name not in self.names:
+            raise AttributeError(name)
+        return lambda *args: self._replay(name, args)
+
+    def _next(self):
+        data, pos = self.data, self.pos
+        if pos >= len(data):
+            raise ReplayEnd("The trace ends after {} calls.".format(self.calls))
+        index, t, nargs = _RECORD.unpack_from(data, pos)
+        pos += _RECORD.size
+        args = []
+        for _ in range(nargs):
+            value, pos = _unpack_value(data, pos)
+            args.append(value)
+        ret, pos = _unpack_value(data, pos)
+        nouts = data[pos]
+        pos += 1
+        outs = []
+        for _ in range(nouts):
+            i, n = _OUT.unpack_from(data, pos)
+            pos += _OUT.size
+            outs.append((i, data[pos:pos + n]))
+            pos += n
+        self.pos = pos
+        return self.names[index], t, args, ret, outs
+
+    def _replay(self, name, args):
+        pos = self.pos
+        recorded, t, rargs, ret, outs = self._next()
+        while recorded != name and not self.strict:
+            self.skipped += 1
+            recorded, t, rargs, ret, outs = self._next()
+        if recorded != name:
+            self.pos = pos
+            raise ReplayError("Call {}: {} made, {} recorded.".format(self.calls, name, recorded))
+        if self.strict:
+            for arg, rarg in zip(args, rargs):
+                if isinstance(rarg, int) and arg != rarg:
+                    self.pos = pos
+                    raise ReplayError("Call {}: {}{} made, {}{} recorded.".format(self.calls, name, tuple(args), name, tuple(rargs)))
+
+        if self.realtime:
+            if self.t0 is None:
+                self.t0 = time.perf_counter() - t
+            delay = self.t0 + t - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+        for i, out in outs:
+            if args[i] is not None:
+                ctypes.memmove(args[i], bytes(out), len(out))
+        self.calls += 1
+        # c_char_p results must outlive the callback
+        self._ret = ret
+        return ret
+
+
+def trace_path(path, when=None):
+    """
+    Stamps path with the local time, e.g. capture.trace -> capture-20170419-093000.trace, and adds a counter if that
+    name is taken, so a new recording never overwrites an older one.
+    """
+    root, ext = os.path.splitext(path)
+    root += time.strftime('-%Y%m%d-%H%M%S', time.localtime(when))
+    stamped = root + ext
+    n = 1
+    while os.path.exists(stamped):
+        stamped = "{}-{}{}".format(root, n, ext)
+        n += 1
+    return stamped
+
+
+def record(j, path, meta=None):
+    """
+    Starts recording the DLL calls of j to path.
+    @return TraceRecorder: Pass it j again with detach() to stop.
+    """
+    recorder = TraceRecorder(path, meta)
+    recorder.attach(j)
+    return recorder
+
+
+def replay_jlink(path, realtime=False, strict=True):
+    """
+    Returns a Jlink answering from the trace at path.
+    """
+    return jlink.Jlink.from_library(ReplayDll(path, realtime, strict), path)
+
+
+def main():
+    import rtt
+    parser = argparse.ArgumentParser(description='Replays the acquisition recorded in a trace.')
+    parser.add_argument('trace')
+    parser.add_argument('--backend', choices=sorted(rtt.BACKENDS), help='defaults to the recorded one')
+    parser.add_argument('--addr', type=lambda s: int(s, 0), help='RTT control block address, defaults to the recorded one')
+    parser.add_argument('--realtime', action='store_true', help='keep the recorded timing')
+    parser.add_argument('--strict', action='store_true', help='fail on the first call differing from the trace')
+    args = parser.parse_args()
+
+    j = replay_jlink(args.trace, args.realtime, args.strict)
+    meta = j.jlink.meta
+    backend = rtt.BACKENDS[args.backend or meta.get('backend', 'kfifo')](j, args.addr or meta.get('addr'))
+    received = polls = 0
+    start = time.perf_counter()
+    try:
+        backend.start()
+        while True:
+            received += len(backend.read(0))
+            polls += 1
+    except ReplayEnd:
+        pass
+    elapsed = time.perf_counter() - start
+    print("{} polls, {} B in {:.3f} s, {} DLL calls replayed, {} skipped".format(
+        polls, received, elapsed, j.jlink.calls, j.jlink.skipped))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,466 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import struct
+import jlink
+from kfifo import RingBuffer, MASK_32
+
+# acID, fifo_up and fifo_down.out: everything update_ring_buffer() needs in one transfer
+_CB_HEAD = struct.Struct('<16s5I4xI')
+
+# SEGGER_RTT_CB header: acID, MaxNumUpBuffers, MaxNumDownBuffers
+_SEGGER_CB = struct.Struct('<16sii')
+# SEGGER_RTT_BUFFER_UP/DOWN: sName, pBuffer, SizeOfBuffer, WrOff, RdOff, Flags
+_SEGGER_BUFFER = struct.Struct('<6I')
+# more buffers than this means the block is not a SEGGER one, the firmware default is 3 up and 3 down
+_SEGGER_MAX_BUFFERS = 64
+_SEGGER_NAME_LEN = 32
+
+
+class TargetReset(jlink.JlinkError):
+    """
+    The control block no longer matches what the backend set up: the target was reset or reflashed.
+    """
+    pass
+
+
+def control_block_signature(jlink, addr, layout='kfifo'):
+    """
+    The firmware specific fields of the control block at addr, none the target updates while running: buffer counts,
+    addresses and sizes. They tell a rebuilt image from the one that was seen at addr, unlike the constant ID.
+    @param str layout: A BACKENDS name, 'native' reads the SEGGER layout.
+    @return bytes: None if the block could not be read or is not of that layout.
+    """
+    errors = jlink.read_errors
+    if layout == 'kfifo':
+        # mask, esize and data of fifo_up and fifo_down
+        words = struct.unpack('<10I', jlink.read(addr + 16, 40))
+        fields = words[2:5] + words[7:10]
+    else:
+        head = jlink.read(addr, _SEGGER_CB.size)
+        acID, num_up, num_down = _SEGGER_CB.unpack(head)
+        if not (0 <= num_up <= _SEGGER_MAX_BUFFERS and 0 <= num_down <= _SEGGER_MAX_BUFFERS):
+            return None
+        table = jlink.read(addr + _SEGGER_CB.size, _SEGGER_BUFFER.size * (num_up + num_down)) if num_up + num_down else b''
+        # sName, pBuffer and SizeOfBuffer of every buffer
+        fields = (num_up, num_down) + tuple(v for fields in _SEGGER_BUFFER.iter_unpack(table) for v in fields[:3])
+    if jlink.read_errors != errors:
+        return None
+    return struct.pack('<{}I'.format(len(fields)), *fields)
+
+
+class _HostBackend(object):
+    """
+    Base of the backends implementing RTT on the host: target memory accesses, counted as DLL round trips.
+    """
+
+    def __init__(self, jlink, addr):
+        self.jlink    = jlink
+        self.RTT_addr = addr
+        # DLL round trips in total, over the polls, and in the last read()
+        self.round_trips      = 0
+        self.polls            = 0
+        self.poll_round_trips = 0
+        # (pending bytes, size) per up channel as the last poll found them, before draining
+        self.fill             = []
+        # bytes the target wrote per up channel since the previous poll, from the WrOff advance
+        self.written          = []
+        # bytes per up channel the target overwrote before the last poll could read them, empty if undetectable
+        self.overrun          = []
+
+    def mem_read_into(self, addr, buf):
+        self.round_trips += 1
+        return self.jlink.read_into(addr, buf)
+
+    def mem_write(self, addr, data):
+        self.round_trips += 1
+        self.jlink.write(addr, data)
+
+    def mem_write_32(self, addr, value):
+        self.round_trips += 1
+        self.jlink.write_32(addr, value)
+
+    def stop(self):
+        pass
+
+
+class KfifoBackend(_HostBackend):
+    """
+    RTT implemented on the host: polls the kfifo control block through JLINKARM_ReadMem.
+
+    struct __kfifo
+    {
+        unsigned int	in;
+        unsigned int	out;
+        unsigned int	mask;
+        unsigned int	esize;
+        void		*data;
+    };
+    typedef struct
+    {
+        char   acID[16];
+        struct __kfifo fifo_up;
+        struct __kfifo fifo_down;
+        uint8_t mode_up;
+        uint8_t mode_down;
+    } SEGGER_RTT_CB;
+    """
+
+    def __init__(self, jlink, addr):
+        super().__init__(jlink, addr)
+        self.aUp      = None
+        self.aDown    = None
+        self.acID     = None
+        self.cb_buf   = bytearray(_CB_HEAD.size)
+
+    def start(self):
+        self.setup_ring_buffer()
+
+    def setup_ring_buffer(self):
+        arr, status = self.jlink.read_u32_array(self.RTT_addr + 16, 5 * 2)
+        if any(status):
+            raise jlink.JlinkError("Could not read the RTT control block at 0x{:08X}.".format(self.RTT_addr))
+        self.aUp   = RingBuffer(self.mem_read_into, self.mem_write, arr[0:5])
+        self.aDown = RingBuffer(self.mem_read_into, self.mem_write, arr[5:10])
+        self.acID  = bytes(self.jlink.read(self.RTT_addr, 16))
+
+    def update_ring_buffer(self):
+        """
+        Reads the ID, the up fifo and the down RdOff in a single transfer, and checks them against the setup.
+        Raises TargetReset when the ID changed, the up buffer moved, the target moved RdOff, or WrOff went
+        backwards. WrOff ahead of RdOff by more than the fifo size is an overrun: the oldest bytes were overwritten,
+        the poll skips them and counts them in overrun. A failed transfer leaves the state as it was.
+        """
+        errors = self.jlink.read_errors
+        self.mem_read_into(self.RTT_addr, self.cb_buf)
+        if self.jlink.read_errors != errors:
+            return
+        acID, WrOff, RdOff, mask, _, pBuffer, down_RdOff = _CB_HEAD.unpack(self.cb_buf)
+        up = self.aUp
+        if acID != self.acID:
+            raise TargetReset("The RTT control block ID at 0x{:08X} changed.".format(self.RTT_addr))
+        if mask != up.mask or pBuffer != up.pBuffer:
+            raise TargetReset("The RTT up buffer moved from 0x{:08X}+{} to 0x{:08X}+{}.".format(
+                up.pBuffer, up.mask + 1, pBuffer, mask + 1))
+        if RdOff != up.RdOff or (WrOff - RdOff) & MASK_32 >= 1 << 31:
+            raise TargetReset("The RTT up offsets went from {}/{} to {}/{}.".format(up.WrOff, up.RdOff, WrOff, RdOff))
+        self.written = [(WrOff - up.WrOff) & MASK_32]
+        up.WrOff = WrOff
+        overrun = up.fifo_overrun()
+        # the fifo holds the last fifo_size() bytes written, RdOff goes back to the target with the next read
+        up.RdOff = (up.RdOff + overrun) & MASK_32
+        self.overrun = [overrun]
+        self.aDown.RdOff = down_RdOff
+        self.fill = [(up.fifo_len(), up.fifo_size())]
+
+    def chn_down_full(self):
+        return self.aDown.fifo_full()
+
+    def chn_up_empty(self):
+        return self.aUp.fifo_empty()
+
+    def chn_up_read(self):
+        len = self.aUp.fifo_len()
+        b   = self.aUp.fifo_out(len)
+        self.mem_write_32(self.RTT_addr + 16 + (4 * 5) * 0 + 4, self.aUp.RdOff)
+        # the view aliases the reused receive buffer, hand the caller its own copy
+        return bytearray(b)
+
+    def read(self, channel=0):
+        """
+        Polls the control block once and drains the up fifo: one round trip when nothing is pending, three when
+        the data does not wrap (descriptors, data, RdOff), four otherwise.
+        @return bytearray: Data received, empty when nothing is pending.
+        """
+        self._check_channel(channel)
+        round_trips = self.round_trips
+        self.polls += 1
+        try:
+            self.update_ring_buffer()
+            if self.chn_up_empty():
+                return bytearray()
+            return self.chn_up_read()
+        finally:
+            self.poll_round_trips = self.round_trips - round_trips
+
+    def read_all(self):
+        """
+        @return [bytearray]: Data received per up channel, the kfifo control block only has channel 0.
+        """
+        return [self.read(0)]
+
+    def write(self, channel, data):
+        """
+        Puts as much of data as fits into the down fifo.
+        @return int: Number of bytes accepted.
+        """
+        self._check_channel(channel)
+        if self.chn_down_full():
+            return 0
+        l = self.aDown.fifo_in(bytes(data))
+        self.mem_write_32(self.RTT_addr + 16 + (4 * 5) * 1 + 0, self.aDown.WrOff)
+        return l
+
+    def _check_channel(self, channel):
+        if channel != 0:
+            raise ValueError('The kfifo control block only has channel 0.')
+
+
+class SeggerBuffer(object):
+    """
+    A SEGGER_RTT_BUFFER_UP/DOWN descriptor. Offsets wrap at SizeOfBuffer, any size, and one byte always stays free
+    so that WrOff == RdOff means empty. A buffer of size 0 was never configured by the firmware and stays inactive.
+    """
+
+    def __init__(self, addr, fields):
+        # descriptor address, the host writes RdOff of up buffers and WrOff of down buffers back there
+        self.addr = addr
+        self.sName, self.pBuffer, self.SizeOfBuffer, self.WrOff, self.RdOff, self.Flags = fields
+        self.name = None
+
+    def fifo_len(self):
+        if not self.SizeOfBuffer:
+            return 0
+        return (self.WrOff - self.RdOff) % self.SizeOfBuffer
+
+    def fifo_unused(self):
+        if not self.SizeOfBuffer:
+            return 0
+        return self.SizeOfBuffer - 1 - self.fifo_len()
+
+
+class SeggerBackend(_HostBackend):
+    """
+    RTT implemented on the host for the stock SEGGER control block, with every up and down buffer.
+    A poll reads the ID and the whole descriptor table in one transfer. The target never overwrites unread data,
+    what it skips or trims when a buffer is full leaves no trace in the offsets, only polls finding the buffer full.
+
+    typedef struct {
+        const char*       sName;
+        char*             pBuffer;
+        unsigned          SizeOfBuffer;
+        unsigned          WrOff;
+        volatile unsigned RdOff;
+        unsigned          Flags;
+    } SEGGER_RTT_BUFFER_UP, SEGGER_RTT_BUFFER_DOWN;
+    typedef struct {
+        char                   acID[16];
+        int                    MaxNumUpBuffers;
+        int                    MaxNumDownBuffers;
+        SEGGER_RTT_BUFFER_UP   aUp[SEGGER_RTT_MAX_NUM_UP_BUFFERS];
+        SEGGER_RTT_BUFFER_DOWN aDown[SEGGER_RTT_MAX_NUM_DOWN_BUFFERS];
+    } SEGGER_RTT_CB;
+    """
+
+    def __init__(self, jlink, addr):
+        super().__init__(jlink, addr)
+        self.aUp    = []
+        self.aDown  = []
+        self.acID   = None
+        self.cb_buf = None
+
+    def start(self):
+        self.setup_buffers()
+
+    def _read_exact(self, addr, buf):
+        errors = self.jlink.read_errors
+        self.mem_read_into(addr, buf)
+        if self.jlink.read_errors != errors:
+            raise jlink.JlinkError("Could not read the RTT control block at 0x{:08X}.".format(self.RTT_addr))
+
+    def setup_buffers(self):
+        """
+        Reads the header, then the descriptor table and the buffer names.
+        """
+        head = bytearray(_SEGGER_CB.size)
+        self._read_exact(self.RTT_addr, head)
+        acID, num_up, num_down = _SEGGER_CB.unpack(head)
+        if not (0 <= num_up <= _SEGGER_MAX_BUFFERS and 0 <= num_down <= _SEGGER_MAX_BUFFERS):
+            raise jlink.JlinkError("0x{:08X} does not hold a SEGGER RTT control block ({} up, {} down buffers).".format(
+                self.RTT_addr, num_up, num_down))
+
+        self.cb_buf = bytearray(_SEGGER_CB.size + _SEGGER_BUFFER.size * (num_up + num_down))
+        self._read_exact(self.RTT_addr, self.cb_buf)
+        self.acID = acID
+        buffers = [SeggerBuffer(self.RTT_addr + offset, _SEGGER_BUFFER.unpack_from(self.cb_buf, offset))
+                   for offset in range(_SEGGER_CB.size, len(self.cb_buf), _SEGGER_BUFFER.size)]
+        self.aUp, self.aDown = buffers[:num_up], buffers[num_up:]
+
+        name = bytearray(_SEGGER_NAME_LEN)
+        for buf in buffers:
+            if buf.sName:
+                self.mem_read_into(buf.sName, name)
+                buf.name = bytes(name).split(b'\0', 1)[0].decode(errors='replace')
+
+    def update_buffers(self):
+        """
+        Reads the ID and the descriptor table in a single transfer, and checks them against the setup.
+        Raises TargetReset when the ID changed, a buffer moved, an offset owned by the host was changed by the
+        target, or an offset is out of its buffer. The offsets of a buffer of size 0 are not checked, the firmware
+        leaves the buffers it does not use unconfigured. A failed transfer leaves the state as it was.
+        """
+        errors = self.jlink.read_errors
+        self.mem_read_into(self.RTT_addr, self.cb_buf)
+        if self.jlink.read_errors != errors:
+            return
+        if self.cb_buf[:16] != self.acID:
+            raise TargetReset("The RTT control block ID at 0x{:08X} changed.".format(self.RTT_addr))
+
+        offset = _SEGGER_CB.size
+        written = []
+        for up, buffers in ((True, self.aUp), (False, self.aDown)):
+            for i, buf in enumerate(buffers):
+                sName, pBuffer, size, WrOff, RdOff, Flags = _SEGGER_BUFFER.unpack_from(self.cb_buf, offset)
+                offset += _SEGGER_BUFFER.size
+                if pBuffer != buf.pBuffer or size != buf.SizeOfBuffer:
+                    raise TargetReset("RTT {} buffer {} moved from 0x{:08X}+{} to 0x{:08X}+{}.".format(
+                        'up' if up else 'down', i, buf.pBuffer, buf.SizeOfBuffer, pBuffer, size))
+                if not size:
+                    if up:
+                        written.append(0)
+                    continue
+                if (RdOff if up else WrOff) != (buf.RdOff if up else buf.WrOff) or WrOff >= size or RdOff >= size:
+                    raise TargetReset("RTT {} buffer {} offsets went from {}/{} to {}/{}.".format(
+                        'up' if up else 'down', i, buf.WrOff, buf.RdOff, WrOff, RdOff))
+                if up:
+                    # less than a lap: the target never overwrites what the host has not read
+                    written.append((WrOff - buf.WrOff) % size)
+                buf.WrOff, buf.RdOff, buf.Flags = WrOff, RdOff, Flags
+        self.fill = [(buf.fifo_len(), buf.SizeOfBuffer) for buf in self.aUp]
+        self.written = written
+
+    def drain(self, channel):
+        """
+        Reads what is pending in an up buffer, using the descriptors of the last update_buffers().
+        """
+        buf = self.aUp[channel]
+        n = buf.fifo_len()
+        if n == 0:
+            return bytearray()
+        data = bytearray(n)
+        view = memoryview(data)
+        l = min(n, buf.SizeOfBuffer - buf.RdOff)
+        self.mem_read_into(buf.pBuffer + buf.RdOff, view[:l])
+        if n > l:
+            self.mem_read_into(buf.pBuffer, view[l:])
+        buf.RdOff = (buf.RdOff + n) % buf.SizeOfBuffer
+        self.mem_write_32(buf.addr + 16, buf.RdOff)
+        return data
+
+    def read(self, channel=0):
+        """
+        Polls the control block once and drains one up buffer.
+        @return bytearray: Data received, empty when nothing is pending.
+        """
+        self._check_channel(channel, self.aUp)
+        return self._poll(lambda: self.drain(channel))
+
+    def read_all(self):
+        """
+        Polls the control block once and drains every up buffer.
+        @return [bytearray]: Data received per up channel.
+        """
+        return self._poll(lambda: [self.drain(channel) for channel in range(len(self.aUp))])
+
+    def _poll(self, drain):
+        round_trips = self.round_trips
+        self.polls += 1
+        try:
+            self.update_buffers()
+            return drain()
+        finally:
+            self.poll_round_trips = self.round_trips - round_trips
+
+    def write(self, channel, data):
+        """
+        Puts as much of data as fits into a down buffer.
+        @return int: Number of bytes accepted.
+        """
+        self._check_channel(channel, self.aDown)
+        buf = self.aDown[channel]
+        view = memoryview(data).cast('B')
+        n = min(len(view), buf.fifo_unused())
+        if n == 0:
+            return 0
+        l = min(n, buf.SizeOfBuffer - buf.WrOff)
+        self.mem_write(buf.pBuffer + buf.WrOff, view[:l])
+        if n > l:
+            self.mem_write(buf.pBuffer, view[l:n])
+        buf.WrOff = (buf.WrOff + n) % buf.SizeOfBuffer
+        self.mem_write_32(buf.addr + 12, buf.WrOff)
+        return n
+
+    def _check_channel(self, channel, buffers):
+        if not 0 <= channel < len(buffers):
+            raise ValueError('The control block has no channel {}, it has {}.'.format(channel, len(buffers)))
+
+
+class NativeBackend(object):
+    """
+    RTT implemented by the J-Link DLL (JLINK_RTTERMINAL_*), which polls the stock SEGGER control block on its own.
+    """
+
+    def __init__(self, jlink, addr=None, read_size=0x4000):
+        self.jlink    = jlink
+        self.RTT_addr = addr
+        self.rx_buf   = memoryview(bytearray(read_size))
+        # up buffers, known once the DLL found the control block
+        self.num_up   = 0
+        # the target buffers are drained by the DLL, their fill level is unknown
+        self.fill     = []
+        self.written  = []
+        self.overrun  = []
+        # same counters as KfifoBackend, every read() and write() is one DLL call
+        self.round_trips      = 0
+        self.polls            = 0
+        self.poll_round_trips = 1
+
+    def start(self):
+        self.num_up = 0
+        self.jlink.rtt_start(self.RTT_addr)
+
+    def stop(self):
+        self.jlink.rtt_stop()
+
+    def read(self, channel=0):
+        """
+        Drains what the DLL has received on an up channel.
+        @return bytearray: Data received, empty when nothing is pending.
+        """
+        self.polls += 1
+        self.poll_round_trips = 1
+        return self._read(channel)
+
+    def read_all(self):
+        """
+        Drains every up channel, one DLL call each.
+        @return [bytearray]: Data received per up channel, none while the DLL is still searching the control block.
+        """
+        round_trips = self.round_trips
+        self.polls += 1
+        if self.num_up <= 0:
+            self.round_trips += 1
+            self.num_up = self.jlink.rtt_get_num_buf(jlink.JLINK_RTTERMINAL_BUFFER_DIR_UP)
+        chunks = [self._read(channel) for channel in range(max(self.num_up, 0))]
+        self.poll_round_trips = self.round_trips - round_trips
+        return chunks
+
+    def _read(self, channel):
+        self.round_trips += 1
+        l = self.jlink.rtt_read_into(channel, self.rx_buf)
+        return bytearray(self.rx_buf[:l])
+
+    def write(self, channel, data):
+        """
+        Hands data for a down channel to the DLL.
+        @return int: Number of bytes accepted.
+        """
+        self.round_trips += 1
+        return self.jlink.rtt_write(channel, data)
+
+
+BACKENDS = {
+    'kfifo':  KfifoBackend,
+    'segger': SeggerBackend,
+    'native': NativeBackend,
+}
@@ -0,0 +1,231 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import time
+
+DEFAULT_MIN_INTERVAL = 0.001
+DEFAULT_MAX_INTERVAL = 0.1
+# delay between polls while data flows slowly, the latency budget of a message
+DEFAULT_FLOW_INTERVAL = 0.005
+# cap of the back-off while the target is halted or disconnected
+DEFAULT_HALTED_INTERVAL = 0.5
+# fill fraction of an up buffer counted as a watermark hit, the next poll is due well before
+DEFAULT_HIGH_WATERMARK = 0.75
+# idle time after which the target state is queried, at most once per such period
+STATE_CHECK_INTERVAL = 1.0
+
+
+def parse_intervals(spec):
+    """
+    @param str spec: "min:max" poll intervals in ms, e.g. "1:100".
+    @return (float, float): Min and max intervals in s.
+    """
+    try:
+        lo, hi = (float(v) / 1000 for v in spec.split(':'))
+    except ValueError:
+        lo = hi = None
+    if lo is None or not 0 <= lo <= hi:
+        raise ValueError("Poll intervals must be min:max in ms, not '{}'.".format(spec))
+    return lo, hi
+
+
+def parse_watermark(spec):
+    """
+    @param str spec: Fill level in % of an up buffer, above 0 and at most 100, e.g. "75".
+    @return float: Fill fraction.
+    """
+    try:
+        level = float(spec)
+    except ValueError:
+        level = None
+    if level is None or not 0 < level <= 100:
+        raise ValueError("The high watermark must be a fill level in % above 0 and at most 100, not '{}'.".format(spec))
+    return level / 100
+
+
+class OverflowPredictor(object):
+    """
+    Producer rate of every up channel from the WrOff advance between polls, and the time each channel takes to
+    fill up to high_watermark from empty. A poll finding a channel past the watermark counts as a hit and adds the bytes
+    the target presumably dropped for lack of room: what the rate until then predicts beyond what it wrote. That is a
+    lower bound, a producer always faster than the polls is only ever seen at the rate the polls allow.
+    """
+
+    def __init__(self, high_watermark=DEFAULT_HIGH_WATERMARK, smoothing=0.3):
+        self.high_watermark = high_watermark
+        self.smoothing = smoothing
+        # per up channel: producer bytes/s average, watermark hits, polls finding it full, estimated bytes lost
+        self.rates = []
+        self.hits = []
+        self.full = []
+        self.lost = []
+        self._last = None
+
+    def sample(self, written, fill, now):
+        """
+        @param [int] written: Bytes written per up channel since the previous sample, see the backend written.
+        @param [(int, int)] fill: (pending bytes, size) per up channel.
+        @return [int]: Channels past the watermark.
+        """
+        n = len(written)
+        if len(self.rates) < n:
+            grow = [0] * (n - len(self.rates))
+            self.rates.extend(float(v) for v in grow)
+            self.hits.extend(grow)
+            self.full.extend(grow)
+            self.lost.extend(float(v) for v in grow)
+        dt = now - self._last if self._last is not None else None
+        self._last = now
+
+        a = self.smoothing
+        hit = []
+        for i, (w, (pending, size)) in enumerate(zip(written, fill)):
+            if not size:
+                continue
+            if pending >= self.high_watermark * size:
+                self.hits[i] += 1
+                hit.append(i)
+            if not dt:
+                continue
+            rate = w / max(dt, 1e-6)
+            # one byte of a SEGGER buffer always stays free
+            if pending >= size - 1:
+                self.full[i] += 1
+            if i in hit:
+                # the lack of room, not the producer, may have capped what the target wrote: keep the higher rate
+                self.lost[i] += max(self.rates[i] * dt - w, 0.0)
+                rate = max(rate, self.rates[i])
+            self.rates[i] = a * rate + (1 - a) * self.rates[i]
+        return hit
+
+    def time_to_watermark(self, fill):
+        """
+        @return [float]: Per up channel, seconds an emptied buffer takes to reach the watermark, None without data.
+        """
+        return [self.high_watermark * size / rate if size and rate > 0 else None
+                for rate, (pending, size) in zip(self.rates, fill)]
+
+    def snapshot(self):
+        return {'rates': list(self.rates), 'watermark_hits': list(self.hits), 'full_polls': list(self.full),
+                'lost_estimate': [int(v) for v in self.lost]}
+
+
+class PollScheduler(object):
+    """
+    Adaptive delay between polls. While data flows, polls are flow_interval apart, sooner if an up buffer would reach
+    target_fill at its producer rate before, and at once when a buffer already is past it.
+    Idle polls back off exponentially up to max_interval, or halted_interval while the target is halted or disconnected.
+    With per-channel written counts, channels the scheduler cannot keep below the high watermark are reported in
+    pressure: one was past it, or reaches it from empty faster than min_interval. The caller then speeds the polls up
+    by other means, e.g. a faster SWD clock or priority over other probe commands.
+    """
+
+    def __init__(self, min_interval=DEFAULT_MIN_INTERVAL, max_interval=DEFAULT_MAX_INTERVAL,
+                 halted_interval=DEFAULT_HALTED_INTERVAL, flow_interval=DEFAULT_FLOW_INTERVAL,
+                 target_fill=0.5, high_watermark=DEFAULT_HIGH_WATERMARK, backoff=2.0, smoothing=0.3):
+        """
+        @param float target_fill: Fraction of a buffer allowed to fill up between polls.
+        @param float high_watermark: Fill fraction of an up buffer that must not be reached, above target_fill.
+        @param float smoothing: Weight of the last poll in the producer rate and poll rate averages.
+        """
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.halted_interval = max(halted_interval, max_interval)
+        self.flow_interval = min(max(flow_interval, min_interval), max_interval)
+        self.target_fill = min(target_fill, high_watermark)
+        self.predictor = OverflowPredictor(high_watermark, smoothing)
+        # up channels at risk of overflowing after the last poll
+        self.pressure = []
+        self.backoff = backoff
+        self.smoothing = smoothing
+        self.interval = min_interval
+        self.running = True
+        # metrics: polls, polls/s and producer bytes/s averages, highest fill fraction per up channel
+        self.polls = 0
+        self.poll_rate = 0.0
+        self.producer_rate = 0.0
+        self.fill_peaks = []
+        self._last_poll = None
+        self._last_data = time.perf_counter()
+        self._last_check = 0.0
+
+    def update(self, received, fill=(), now=None, written=()):
+        """
+        Accounts for one poll and picks the delay before the next one.
+        @param int received: Bytes the poll received over all channels.
+        @param [(int, int)] fill: (pending bytes, size) per up channel as the poll found them, empty if unknown.
+        @param [int] written: Bytes written per up channel since the previous poll, empty if unknown.
+        @return float: Delay in s.
+        """
+        now = time.perf_counter() if now is None else now
+        a = self.smoothing
+        if self._last_poll is not None:
+            dt = max(now - self._last_poll, 1e-6)
+            self.poll_rate = a / dt + (1 - a) * self.poll_rate
+            self.producer_rate = a * received / dt + (1 - a) * self.producer_rate
+        self._last_poll = now
+        self.polls += 1
+
+        if len(self.fill_peaks) < len(fill):
+            self.fill_peaks.extend([0.0] * (len(fill) - len(self.fill_peaks)))
+        fullest = 0.0
+        for i, (pending, size) in enumerate(fill):
+            level = pending / size if size else 0.0
+            self.fill_peaks[i] = max(self.fill_peaks[i], level)
+            fullest = max(fullest, level)
+
+        pressure = []
+        deadlines = []
+        if written:
+            pressure = self.predictor.sample(written, fill, now)
+            for i, t in enumerate(self.predictor.time_to_watermark(fill)):
+                if t is not None:
+                    deadlines.append(t)
+                    if t < self.min_interval and i not in pressure:
+                        pressure.append(i)
+        self.pressure = pressure
+
+        if received:
+            self._last_data = now
+            self.running = True
+            sizes = [size for pending, size in fill if size]
+            interval = self.flow_interval
+            if fullest >= self.target_fill:
+                interval = self.min_interval
+            elif deadlines:
+                # polls due when the fastest channel is at target_fill, well before its high watermark
+                ratio = self.target_fill / self.predictor.high_watermark
+                interval = min(interval, min(deadlines) * ratio)
+            elif sizes and self.producer_rate > 0:
+                interval = min(interval, min(sizes) * self.target_fill / self.producer_rate)
+            self.interval = min(max(interval, self.min_interval), self.max_interval)
+        else:
+            cap = self.max_interval if self.running else self.halted_interval
+            self.interval = min(max(self.interval, self.flow_interval) * self.backoff, cap)
+        return self.interval
+
+    def state_check_due(self, now=None):
+        """
+        @return bool: True when the target has been idle long enough for set_running() to be worth a query.
+        """
+        now = time.perf_counter() if now is None else now
+        if now - self._last_data < STATE_CHECK_INTERVAL or now - self._last_check < STATE_CHECK_INTERVAL:
+            return False
+        self._last_check = now
+        return True
+
+    def set_running(self, running):
+        """
+        @param bool running: False while the target is halted or disconnected, the back-off then goes further.
+        """
+        self.running = running
+
+    def snapshot(self):
+        snapshot = {'interval': self.interval, 'polls': self.polls, 'poll_rate': self.poll_rate,
+                    'producer_rate': self.producer_rate, 'fill_peaks': list(self.fill_peaks), 'running': self.running,
+                    'pressure': list(self.pressure)}
+        snapshot.update(self.predictor.snapshot())
+        return snapshot
+
+    def reset_peaks(self):
+        self.fill_peaks = [0.0] * len(self.fill_peaks)
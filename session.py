@@ -0,0 +1,155 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import time
+import autotune
+import cache
+import discover
+import jlink
+import rtt
+
+RTT_ADDR_CACHE = 'rtt_addr.json'
+
+
+class JlinkSession(object):
+    """
+    A probe connection kept warm across Stop/Start: the DLL stays loaded, the probe configuration and the tuned
+    speed are remembered, and the last RTT control block address is checked with one read instead of a scan.
+    Across runs the address is kept in RTT_ADDR_CACHE per probe and target, with a hash of the firmware specific
+    control block fields found there (see rtt.control_block_signature). The firmware ELF symbol, when there is one,
+    comes before both.
+    Every method runs in the thread owning the Jlink, the JlinkIO thread in the console.
+    """
+
+    def __init__(self, jlink, vector_base=0, mode=jlink.JLINK_MODE_SWD, speed=jlink._DEFAULT_JLINK_SPEED_KHZ):
+        """
+        @param Jlink jlink: Loaded library, kept for the lifetime of the session.
+        @param int vector_base: Constant region for the SWD speed tuning, see autotune.SpeedTuner.
+        """
+        self.jlink = jlink
+        self.vector_base = vector_base
+        self.mode = mode
+        self.speed = speed
+        self.hardware_version = None
+        self.tuner = None
+        self.RTT_addr = None
+        # control block layout hashed into RTT_ADDR_CACHE, an rtt.BACKENDS name
+        self.layout = 'kfifo'
+        # connect() count, persistent cache hits and full scans among them, duration of the last one in s
+        self.connects = 0
+        self.cache_hits = 0
+        self.scans = 0
+        self.connect_time = None
+        # how the last connect() found the control block: 'symbol', 'session', 'cache' or 'scan'
+        self.located_by = None
+        self._use_cache = True
+
+    def connect(self, scan, autospeed=False, symbol=None, layout=None):
+        """
+        Opens the probe and locates the RTT control block, see relocate().
+        @param callable scan: scan() returning the control block address, called on the first connect or a cache miss.
+        @param bool autospeed: Use the tuned SWD speed, tuned or loaded from the autotune cache once per session.
+        @param callable symbol: symbol() returning the address of the control block symbol of the firmware ELF, None
+                                without an ELF.
+        @param str layout: Control block layout, an rtt.BACKENDS name, the last one if None.
+        @return int: Control block address.
+        """
+        start = time.perf_counter()
+        j = self.jlink
+        if not j.is_open():
+            j.open()
+        if self.hardware_version is None:
+            self.hardware_version = j.get_hardware_verion()
+        j.set_mode(self.mode)
+
+        if not autospeed:
+            self.tuner = None
+            j.set_speed(self.speed)
+        elif self.tuner is None:
+            self.tuner = autotune.SpeedTuner(j, self.vector_base)
+            self.tuner.apply()
+        else:
+            j.set_speed(self.tuner.speed)
+
+        if layout is not None:
+            self.layout = layout
+        self.relocate(scan, symbol)
+        self.connects += 1
+        self.connect_time = time.perf_counter() - start
+        return self.RTT_addr
+
+    def relocate(self, scan, symbol=None):
+        """
+        Locates the control block on the open connection, e.g. again after a target reset: the ELF symbol if it holds
+        the tag, then one read at the last address, then the persistent cache, then scan(). The read errors meanwhile
+        do not count for the SWD speed tuner.
+        @return int: Control block address.
+        """
+        try:
+            addr = symbol() if symbol is not None else None
+            if addr is not None and self.is_control_block(addr):
+                self.located_by = 'symbol'
+                self.RTT_addr = addr
+                self._store(addr)
+            elif self.RTT_addr is not None and self.is_control_block(self.RTT_addr):
+                self.located_by = 'session'
+            else:
+                self.RTT_addr = self._locate(scan)
+        finally:
+            # the failed reads of locating are expected, e.g. a scan past the end of RAM, not a sign of a bad speed
+            if self.tuner is not None:
+                self.tuner.ignore_errors()
+        return self.RTT_addr
+
+    def _key(self):
+        return "{}:{:08X}".format(self.jlink.get_SN(), self.jlink.get_ID())
+
+    def _locate(self, scan):
+        entry = cache.load(RTT_ADDR_CACHE).get(self._key())
+        if self._use_cache and isinstance(entry, dict):
+            digest = self._hash(entry.get('addr'))
+            if digest is not None and digest == entry.get('hash'):
+                self.cache_hits += 1
+                self.located_by = 'cache'
+                return entry['addr']
+
+        addr = scan()
+        self.scans += 1
+        self.located_by = 'scan'
+        self._store(addr)
+        return addr
+
+    def _store(self, addr):
+        self._use_cache = True
+        addrs = cache.load(RTT_ADDR_CACHE)
+        addrs[self._key()] = {'addr': addr, 'layout': self.layout, 'hash': self._hash(addr)}
+        cache.store(RTT_ADDR_CACHE, addrs)
+
+    def _hash(self, addr):
+        if not isinstance(addr, int) or not 0 <= addr <= 0xFFFFFFFF or not self.is_control_block(addr):
+            return None
+        signature = rtt.control_block_signature(self.jlink, addr, self.layout)
+        if signature is None:
+            return None
+        return hashlib.sha1(self.layout.encode() + signature).hexdigest()
+
+    def is_control_block(self, addr):
+        errors = self.jlink.read_errors
+        tag = self.jlink.read(addr, len(discover.RTT_TAG))
+        return self.jlink.read_errors == errors and tag == discover.RTT_TAG
+
+    def disconnect(self):
+        """
+        Closes the probe connection, the DLL and the cached state stay for the next connect().
+        """
+        if self.jlink.is_open():
+            self.jlink.close()
+
+    def forget(self):
+        """
+        Drops the cached control block address, e.g. after flashing a different firmware.
+        The next connect() scans and replaces the persistent entry.
+        """
+        self.RTT_addr = None
+        self._use_cache = False
@@ -0,0 +1,169 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+Target RAM in a memory-mapped file, for firmware built natively and run as a separate process.
+POSIX shared memory segments are files under /dev/shm on Linux and map the same way.
+
+ShmTarget offers the memory access methods jlink.Jlink offers to RingBuffer and the rtt backends, reads are
+zero-copy memoryview slices of the mapping.
+
+    python shmtarget.py firmware /dev/shm/rtt [--rate N] [--burst N] [--seconds N]
+    python shmtarget.py console /dev/shm/rtt [--seconds N] [--interval S]
+"""
+
+import argparse
+import mmap
+import struct
+import time
+from array import array
+import jlink
+import rtt
+import simtarget
+
+_DEFAULT_READ_MERGE_GAP = jlink._DEFAULT_READ_MERGE_GAP
+
+
+class ShmTarget(object):
+    """
+    Maps size bytes of path as the target RAM starting at address base.
+    """
+
+    def __init__(self, path, base=simtarget.SIM_RAM_BASE, size=simtarget.SIM_RAM_SIZE, create=False):
+        """
+        @param bool create: Create or resize the file to size bytes, otherwise map the existing file whole.
+        """
+        self.path = path
+        self.base = base
+        # failed reads, kept for the Jlink interface: a mapping never fails
+        self.read_errors = 0
+        with open(path, 'w+b' if create else 'r+b') as f:
+            if create:
+                f.truncate(size)
+            self.mm = mmap.mmap(f.fileno(), size if create else 0)
+        self.mem = memoryview(self.mm)
+
+    def close(self):
+        self.mem.release()
+        self.mm.close()
+
+    def is_open(self):
+        return not self.mm.closed
+
+    def find(self, tag):
+        """
+        @return int: Address of the first occurrence of tag in the mapping, None if absent.
+        """
+        off = self.mm.find(tag)
+        return None if off < 0 else self.base + off
+
+    def _view(self, addr, data_len):
+        off = addr - self.base
+        if off < 0 or data_len < 0 or off + data_len > len(self.mem):
+            raise jlink.JlinkError("0x{:08X}+{} is outside the mapped target RAM.".format(addr, data_len))
+        return self.mem[off:off + data_len]
+
+    def read(self, addr, data_len):
+        """
+        @return memoryview: The live mapping at addr, copy it to keep a snapshot.
+        """
+        return self._view(addr, data_len)
+
+    def read_into(self, addr, buf, offset=0):
+        view = memoryview(buf).cast('B')
+        data_len = len(view) - offset
+        view[offset:] = self._view(addr, data_len)
+        return data_len
+
+    def read_many(self, regions, gap=_DEFAULT_READ_MERGE_GAP):
+        return [self._view(addr, data_len) for addr, data_len in regions]
+
+    def read_u32_array(self, addr, count, as_numpy=False):
+        return self._read_array(jlink._U32_TYPECODE, 4, addr, count, as_numpy)
+
+    def read_u16_array(self, addr, count, as_numpy=False):
+        return self._read_array(jlink._U16_TYPECODE, 2, addr, count, as_numpy)
+
+    def _read_array(self, typecode, width, addr, count, as_numpy):
+        if addr % width:
+            raise ValueError('The addr parameter must be aligned to {} bytes.'.format(width))
+        values = array(typecode)
+        values.frombytes(self._view(addr, count * width))
+        status = array('B', bytes(count))
+        if as_numpy:
+            import numpy
+            return numpy.frombuffer(values, dtype=numpy.dtype(typecode)), numpy.frombuffer(status, dtype=numpy.uint8)
+        return values, status
+
+    def read_32(self, addr):
+        return struct.unpack_from('<I', self._view(addr, 4))[0]
+
+    def read_16(self, addr):
+        return struct.unpack_from('<H', self._view(addr, 2))[0]
+
+    def write(self, addr, data):
+        view = memoryview(data).cast('B')
+        self._view(addr, len(view))[:] = view
+
+    def write_32(self, addr, data):
+        struct.pack_into('<I', self._view(addr, 4), 0, data)
+
+    def write_16(self, addr, data):
+        struct.pack_into('<H', self._view(addr, 2), 0, data)
+
+
+def firmware(args):
+    """
+    Simulated firmware: a SimTarget whose RAM is the mapping, producing counting data and blocking when the up fifo is full.
+    """
+    shm = ShmTarget(args.path, create=True)
+    target = simtarget.SimTarget(ram=shm.mm, ram_base=shm.base, mode_up=simtarget.MODE_BLOCK)
+    target.start(simtarget.Producer(args.rate, args.burst))
+    try:
+        time.sleep(args.seconds)
+    finally:
+        target.stop()
+    print("firmware: {} B produced, {} B lost".format(target.produced, target.lost))
+
+
+def console(args):
+    """
+    Drains the mapping with the kfifo backend and checks the counting data.
+    """
+    shm = ShmTarget(args.path)
+    addr = shm.find(simtarget.RTT_TAG)
+    if addr is None:
+        raise SystemExit("No RTT control block in {}.".format(args.path))
+
+    backend = rtt.KfifoBackend(shm, addr)
+    backend.start()
+    received = polls = 0
+    first = None
+    intact = True
+    end = time.perf_counter() + args.seconds
+    while time.perf_counter() < end:
+        b = backend.read(0)
+        if b:
+            first = b[0] if first is None else first
+            intact = intact and b == simtarget.counting_data(first + received, len(b))
+            received += len(b)
+        polls += 1
+        if args.interval:
+            time.sleep(args.interval)
+    print("console: {:.1f} KB/s, {} polls, data {}".format(
+        received / args.seconds / 1024, polls, "intact" if intact else "has gaps or corruption"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cross-process RTT over a memory-mapped file.')
+    parser.add_argument('role', choices=('firmware', 'console'))
+    parser.add_argument('path')
+    parser.add_argument('--rate', type=int, default=4 * 1024 * 1024)
+    parser.add_argument('--burst', type=int, default=256)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--interval', type=float, default=0.0)
+    args = parser.parse_args()
+    firmware(args) if args.role == 'firmware' else console(args)
+
+
+if __name__ == '__main__':
+    main()
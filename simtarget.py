@@ -0,0 +1,538 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+In-process simulated target, no probe needed.
+
+SimTarget is a stub library for jlink.bind_prototypes(): a RAM image holding a kfifo RTT control block, with
+producer threads emulating firmware writing to the up fifo and a consumer thread draining the down fifo.
+sim_jlink() returns a jlink.Jlink driving it, usable wherever a probe-backed Jlink is.
+"""
+
+import bisect
+import ctypes
+import struct
+import threading
+import time
+import jlink
+
+RTT_TAG = b"SEGGER RTT"
+SIM_RAM_BASE = 0x20000000
+SIM_RAM_SIZE = 0x10000
+
+# what the firmware does with data that does not fit in the up fifo, SEGGER_RTT_MODE_*
+MODE_SKIP  = 0
+MODE_TRIM  = 1
+MODE_BLOCK = 2
+
+_FIFO = struct.Struct('<5I')
+# SEGGER_RTT_BUFFER_UP/DOWN: sName, pBuffer, SizeOfBuffer, WrOff, RdOff, Flags
+_SEGGER_BUFFER = struct.Struct('<6I')
+_SEGGER_NAME_LEN = 16
+
+
+def counting_data(offset, n):
+    """
+    Byte i of the stream is i & 0xFF, so gaps and corruption are easy to spot.
+    """
+    start = offset & 0xFF
+    return (bytes(range(256)) * (n // 256 + 2))[start:start + n]
+
+
+class Producer(object):
+    """
+    Firmware log pattern: burst bytes at once, rate bytes/s on average, optionally on for on_time s then off for off_time s.
+    """
+
+    def __init__(self, rate, burst=64, on_time=None, off_time=0.0, data=counting_data, channel=0):
+        self.rate = rate
+        self.burst = burst
+        self.on_time = on_time
+        self.off_time = off_time
+        self.data = data
+        self.channel = channel
+
+    def active(self, t):
+        if self.on_time is None:
+            return True
+        return t % (self.on_time + self.off_time) < self.on_time
+
+
+class SimTarget(object):
+    """
+    A simulated target implementing the JLINKARM_* memory entry points and the JLINK_RTTERMINAL_* engine.
+    Accesses are serialized by one lock, like the bus between the firmware and the debug port.
+    """
+
+    def __init__(self, cb_addr=SIM_RAM_BASE + 0x400, ram_base=SIM_RAM_BASE, ram_size=SIM_RAM_SIZE,
+                 up_size=0x400, down_size=0x100, mode_up=MODE_SKIP, echo=False, ram=None):
+        """
+        @param int cb_addr: Where the control block is placed, the up and down fifos follow it.
+        @param buffer ram: Writable buffer to use as RAM image instead of allocating ram_size bytes, e.g. an mmap.
+        @param int up_size: Up fifo size, a power of two as kfifo requires.
+        @param bool echo: Feed the bytes consumed from the down fifo back into the up fifo.
+        """
+        self.ram_base = ram_base
+        if ram is None:
+            self.ram = (ctypes.c_uint8 * ram_size)()
+        else:
+            self.ram = (ctypes.c_uint8 * len(ram)).from_buffer(ram)
+        self.cb_addr = cb_addr
+        self.up_addr = cb_addr + 0x40
+        self.up_size = up_size
+        self.down_addr = self.up_addr + up_size
+        self.down_size = down_size
+        self.mode_up = mode_up
+        self.echo = echo
+        self.lock = threading.RLock()
+
+        self.produced = 0
+        self.lost = 0
+        self.down_data = bytearray()
+        self.halted = False
+        self.speed = 4000
+        self.opened = True
+        self._log_offsets = []
+        self._log_times = []
+        self._threads = []
+        self._stop = threading.Event()
+
+        self._init_control_block()
+
+    def _init_control_block(self):
+        cb = RTT_TAG.ljust(16, b'\0')
+        cb += _FIFO.pack(0, 0, self.up_size - 1, 1, self.up_addr)
+        cb += _FIFO.pack(0, 0, self.down_size - 1, 1, self.down_addr)
+        cb += struct.pack('<BB', self.mode_up, MODE_SKIP)
+        self._poke(self.cb_addr, cb)
+
+    def _offset(self, addr, n):
+        off = addr - self.ram_base
+        if off < 0 or off + n > len(self.ram):
+            return None
+        return off
+
+    def _poke(self, addr, data):
+        off = self._offset(addr, len(data))
+        ctypes.memmove(ctypes.addressof(self.ram) + off, bytes(data), len(data))
+
+    def _word(self, addr):
+        return ctypes.c_uint32.from_buffer(self.ram, addr - self.ram_base)
+
+    def _fifo(self, idx):
+        """
+        @return (c_uint32, c_uint32, int, int): in and out words, size and data address of the up (0) or down (1) fifo.
+        """
+        base = self.cb_addr + 16 + 20 * idx
+        if idx == 0:
+            return self._word(base), self._word(base + 4), self.up_size, self.up_addr
+        return self._word(base), self._word(base + 4), self.down_size, self.down_addr
+
+    # firmware side
+
+    def put_up(self, data, channel=0):
+        """
+        Writes data into the up fifo as SEGGER_RTT_Write would in the configured mode.
+        @return int: Number of bytes stored.
+        """
+        self._check_channel(channel, 1)
+        with self.lock:
+            wr, rd, size, addr = self._fifo(0)
+            free = size - ((wr.value - rd.value) & 0xFFFFFFFF)
+            if self.mode_up == MODE_SKIP and len(data) > free:
+                n = 0
+            else:
+                n = min(len(data), free)
+            off = wr.value & (size - 1)
+            l = min(n, size - off)
+            self._poke(addr + off, data[:l])
+            self._poke(addr, data[l:n])
+            if n:
+                self._log_write(self.produced, self.produced - ((wr.value - rd.value) & 0xFFFFFFFF) - size)
+            wr.value = (wr.value + n) & 0xFFFFFFFF
+            self.produced += n
+            if self.mode_up != MODE_BLOCK:
+                self.lost += len(data) - n
+            return n
+
+    def reset(self, cb_addr=None):
+        """
+        Emulates a target reset: RAM is cleared and the firmware sets the control block up again,
+        at cb_addr if given as after a reflash. The producers keep their stream offsets.
+        """
+        with self.lock:
+            ctypes.memset(self.ram, 0, len(self.ram))
+            if cb_addr is not None:
+                self.cb_addr = cb_addr
+                self.up_addr = cb_addr + 0x40
+                self.down_addr = self.up_addr + self.up_size
+            self._init_control_block()
+
+    def get_down(self, n=None, channel=0):
+        """
+        Consumes the down fifo as SEGGER_RTT_Read would.
+        @return bytes: Data read.
+        """
+        self._check_channel(channel, 1)
+        with self.lock:
+            wr, rd, size, addr = self._fifo(1)
+            n = (wr.value - rd.value) & 0xFFFFFFFF if n is None else min(n, (wr.value - rd.value) & 0xFFFFFFFF)
+            data = self._take(rd, size, addr, n)
+            self.down_data.extend(data)
+            return data
+
+    def _take(self, rd, size, addr, n):
+        off = rd.value & (size - 1)
+        l = min(n, size - off)
+        base = self._offset(addr, size)
+        data = bytes(self.ram[base + off:base + off + l]) + bytes(self.ram[base:base + n - l])
+        rd.value = (rd.value + n) & 0xFFFFFFFF
+        return data
+
+    def _check_channel(self, channel, count):
+        if not 0 <= channel < count:
+            raise ValueError('The simulated target has no channel {}.'.format(channel))
+
+    def _log_write(self, offset, before):
+        """
+        Logs the time of a write at stream offset. Entries wholly below before, at least a buffer behind what the host
+        acknowledged, are never asked for again and dropped: the log holds at most two buffers worth of writes.
+        """
+        self._log_offsets.append(offset)
+        self._log_times.append(time.perf_counter())
+        i = bisect.bisect_right(self._log_offsets, before) - 1
+        if i > 0:
+            del self._log_offsets[:i]
+            del self._log_times[:i]
+
+    def produced_at(self, offset):
+        """
+        @return float: perf_counter() time the channel 0 up stream byte at offset was written, for latency measurements.
+        """
+        with self.lock:
+            i = bisect.bisect_right(self._log_offsets, offset) - 1
+            return self._log_times[max(i, 0)] if self._log_times else None
+
+    def start(self, *producers, consume_interval=0.001):
+        """
+        Starts one thread per producer and the down fifo consumer.
+        """
+        self._stop.clear()
+        for producer in producers:
+            self._threads.append(threading.Thread(target=self._produce, args=(producer,), daemon=True))
+        self._threads.append(threading.Thread(target=self._consume, args=(consume_interval,), daemon=True))
+        for t in self._threads:
+            t.start()
+
+    def stop(self):
+        self._stop.set()
+        for t in self._threads:
+            t.join()
+        self._threads = []
+
+    def _produce(self, producer):
+        t0 = time.perf_counter()
+        due = t0
+        offset = 0
+        while not self._stop.is_set():
+            now = time.perf_counter()
+            if producer.active(now - t0):
+                data = producer.data(offset, producer.burst)
+                if self.mode_up == MODE_BLOCK:
+                    while data and not self._stop.is_set():
+                        data = data[self.put_up(data, producer.channel):]
+                        if data:
+                            time.sleep(0.0002)
+                else:
+                    self.put_up(data, producer.channel)
+                offset += producer.burst
+            due = max(due + producer.burst / float(producer.rate), now - 0.1)
+            delay = due - time.perf_counter()
+            if delay > 0:
+                self._stop.wait(delay)
+
+    def _consume(self, interval):
+        while not self._stop.wait(interval):
+            data = self.get_down()
+            if data and self.echo:
+                self.put_up(data)
+
+    # JLINKARM_* entry points
+
+    def JLINKARM_ReadMem(self, addr, data_len, buf):
+        with self.lock:
+            off = self._offset(addr, data_len)
+            if off is None:
+                ctypes.memset(buf, 0, data_len)
+                return 1
+            ctypes.memmove(buf, ctypes.addressof(self.ram) + off, data_len)
+            return 0
+
+    def JLINKARM_WriteMem(self, addr, data_len, buf):
+        with self.lock:
+            off = self._offset(addr, data_len)
+            if off is None:
+                return -1
+            ctypes.memmove(ctypes.addressof(self.ram) + off, buf, data_len)
+            return data_len
+
+    def _read_items(self, width, addr, count, data, status):
+        with self.lock:
+            off = self._offset(addr, width * count)
+            if off is None:
+                ctypes.memset(status, 1, count)
+                return -1
+            ctypes.memmove(data, ctypes.addressof(self.ram) + off, width * count)
+            ctypes.memset(status, 0, count)
+            return count
+
+    def JLINKARM_ReadMemU32(self, addr, count, data, status):
+        return self._read_items(4, addr, count, data, status)
+
+    def JLINKARM_ReadMemU16(self, addr, count, data, status):
+        return self._read_items(2, addr, count, data, status)
+
+    def JLINKARM_ReadMemU8(self, addr, count, data, status):
+        return self._read_items(1, addr, count, data, status)
+
+    def _write_item(self, fmt, addr, value):
+        with self.lock:
+            data = struct.pack(fmt, value)
+            if self._offset(addr, len(data)) is None:
+                return -1
+            self._poke(addr, data)
+            return 0
+
+    def JLINKARM_WriteU32(self, addr, value):
+        return self._write_item('<I', addr, value)
+
+    def JLINKARM_WriteU16(self, addr, value):
+        return self._write_item('<H', addr, value)
+
+    def JLINKARM_WriteU8(self, addr, value):
+        return self._write_item('<B', addr, value)
+
+    def JLINKARM_GetDLLVersion(self):
+        return 69000
+
+    def JLINKARM_GetHardwareVersion(self):
+        return 110000
+
+    def JLINKARM_GetSN(self):
+        return 0x51300000
+
+    def JLINKARM_GetId(self):
+        return 0x0BB11477
+
+    def JLINKARM_TIF_Select(self, interface):
+        return 0
+
+    def JLINKARM_SetSpeed(self, speed):
+        self.speed = speed
+
+    def JLINKARM_GetSpeed(self):
+        return min(self.speed, 0xFFFF)
+
+    def JLINKARM_Open(self):
+        self.opened = True
+
+    def JLINKARM_IsOpen(self):
+        return self.opened
+
+    def JLINKARM_Close(self):
+        self.opened = False
+
+    def JLINKARM_IsConnected(self):
+        return True
+
+    def JLINKARM_IsHalted(self):
+        return int(self.halted)
+
+    def JLINKARM_Halt(self):
+        self.halted = True
+        return False
+
+    def JLINKARM_Go(self):
+        self.halted = False
+
+    def JLINKARM_ReadReg(self, reg):
+        # the core is not simulated, every register reads 0
+        return 0
+
+    def JLINKARM_ClrError(self):
+        pass
+
+    def JLINKARM_HasError(self):
+        return False
+
+    # JLINK_RTTERMINAL_* engine, polled on every call instead of in a DLL thread
+
+    def JLINK_RTTERMINAL_Control(self, cmd, p):
+        if cmd == jlink.JLINK_RTTERMINAL_CMD_GETNUMBUF:
+            return 1
+        return 0
+
+    def JLINK_RTTERMINAL_Read(self, index, buf, size):
+        if index != 0:
+            return -1
+        with self.lock:
+            wr, rd, fifo_size, addr = self._fifo(0)
+            data = self._take(rd, fifo_size, addr, min(size, (wr.value - rd.value) & 0xFFFFFFFF))
+        ctypes.memmove(buf, data, len(data))
+        return len(data)
+
+    def JLINK_RTTERMINAL_Write(self, index, buf, size):
+        if index != 0:
+            return -1
+        with self.lock:
+            wr, rd, fifo_size, addr = self._fifo(1)
+            n = min(size, fifo_size - ((wr.value - rd.value) & 0xFFFFFFFF))
+            data = ctypes.string_at(buf, n)
+            off = wr.value & (fifo_size - 1)
+            l = min(n, fifo_size - off)
+            self._poke(addr + off, data[:l])
+            self._poke(addr, data[l:])
+            wr.value = (wr.value + n) & 0xFFFFFFFF
+            return n
+
+
+class SeggerSimTarget(SimTarget):
+    """
+    A SimTarget holding the stock SEGGER RTT control block: several up and down buffers of any size, offsets
+    wrapping at the buffer size with one byte kept free. The buffers and their names follow the control block.
+    """
+
+    def __init__(self, cb_addr=SIM_RAM_BASE + 0x400, up_sizes=(0x400,), down_sizes=(0x100,), **kwargs):
+        """
+        @param (int, ...) up_sizes: Size of every up buffer, any size, 0 for one the firmware left unconfigured.
+        Other parameters as SimTarget, except up_size and down_size.
+        """
+        self.up_sizes = tuple(up_sizes)
+        self.down_sizes = tuple(down_sizes)
+        self.channel_produced = [0] * len(self.up_sizes)
+        self.channel_lost = [0] * len(self.up_sizes)
+        super().__init__(cb_addr, up_size=self.up_sizes[0], down_size=self.down_sizes[0], **kwargs)
+
+    def _init_control_block(self):
+        sizes = self.up_sizes + self.down_sizes
+        names_addr = self.cb_addr + 24 + _SEGGER_BUFFER.size * len(sizes)
+        addr = names_addr + _SEGGER_NAME_LEN * len(sizes)
+        cb = RTT_TAG.ljust(16, b'\0') + struct.pack('<ii', len(self.up_sizes), len(self.down_sizes))
+        names = b''
+        # (descriptor address, buffer address, size) of the up then the down buffers
+        self.buffers = []
+        for i, size in enumerate(sizes):
+            channel = i if i < len(self.up_sizes) else i - len(self.up_sizes)
+            name = b'Terminal' if channel == 0 else 'Channel{}'.format(channel).encode()
+            names += name.ljust(_SEGGER_NAME_LEN, b'\0')
+            flags = self.mode_up if i < len(self.up_sizes) else MODE_SKIP
+            # like the firmware, a buffer of size 0 is left unconfigured: no name, no memory
+            if size:
+                cb += _SEGGER_BUFFER.pack(names_addr + _SEGGER_NAME_LEN * i, addr, size, 0, 0, flags)
+            else:
+                cb += _SEGGER_BUFFER.pack(0, 0, 0, 0, 0, 0)
+            self.buffers.append((self.cb_addr + 24 + _SEGGER_BUFFER.size * i, addr if size else 0, size))
+            addr += size
+        self.up_addr = self.buffers[0][1]
+        self.down_addr = self.buffers[len(self.up_sizes)][1] if self.down_sizes else None
+        self._poke(self.cb_addr, cb + names)
+
+    def _offsets(self, idx):
+        """
+        @return (c_uint32, c_uint32, int, int): WrOff and RdOff words, size and address of buffer idx, down ones
+                                                after the up ones.
+        """
+        desc, addr, size = self.buffers[idx]
+        return self._word(desc + 12), self._word(desc + 16), size, addr
+
+    def put_up(self, data, channel=0):
+        self._check_channel(channel, len(self.up_sizes))
+        with self.lock:
+            wr, rd, size, addr = self._offsets(channel)
+            if not size:
+                if self.mode_up != MODE_BLOCK:
+                    self.lost += len(data)
+                    self.channel_lost[channel] += len(data)
+                return 0
+            free = (rd.value - wr.value - 1) % size
+            if self.mode_up == MODE_SKIP and len(data) > free:
+                n = 0
+            else:
+                n = min(len(data), free)
+            off = wr.value
+            l = min(n, size - off)
+            self._poke(addr + off, data[:l])
+            self._poke(addr, data[l:n])
+            if channel == 0 and n:
+                produced = self.channel_produced[0]
+                self._log_write(produced, produced - (off - rd.value) % size - size)
+            wr.value = (off + n) % size
+            self.produced += n
+            self.channel_produced[channel] += n
+            if self.mode_up != MODE_BLOCK:
+                self.lost += len(data) - n
+                self.channel_lost[channel] += len(data) - n
+            return n
+
+    def get_down(self, n=None, channel=0):
+        self._check_channel(channel, len(self.down_sizes))
+        with self.lock:
+            data = self._take_segger(len(self.up_sizes) + channel, n)
+            self.down_data.extend(data)
+            return data
+
+    def _take_segger(self, idx, n=None):
+        wr, rd, size, addr = self._offsets(idx)
+        if not size:
+            return b''
+        avail = (wr.value - rd.value) % size
+        n = avail if n is None else min(n, avail)
+        off = rd.value
+        l = min(n, size - off)
+        base = self._offset(addr, size)
+        data = bytes(self.ram[base + off:base + off + l]) + bytes(self.ram[base:base + n - l])
+        rd.value = (off + n) % size
+        return data
+
+    def _consume(self, interval):
+        while not self._stop.wait(interval):
+            for channel in range(len(self.down_sizes)):
+                data = self.get_down(channel=channel)
+                if data and self.echo and channel < len(self.up_sizes):
+                    self.put_up(data, channel)
+
+    def JLINK_RTTERMINAL_Control(self, cmd, p):
+        if cmd == jlink.JLINK_RTTERMINAL_CMD_GETNUMBUF:
+            direction = ctypes.c_int.from_address(p).value
+            return len(self.up_sizes if direction == jlink.JLINK_RTTERMINAL_BUFFER_DIR_UP else self.down_sizes)
+        return 0
+
+    def JLINK_RTTERMINAL_Read(self, index, buf, size):
+        if not 0 <= index < len(self.up_sizes):
+            return -1
+        with self.lock:
+            data = self._take_segger(index, size)
+        ctypes.memmove(buf, data, len(data))
+        return len(data)
+
+    def JLINK_RTTERMINAL_Write(self, index, buf, size):
+        if not 0 <= index < len(self.down_sizes):
+            return -1
+        with self.lock:
+            wr, rd, fifo_size, addr = self._offsets(len(self.up_sizes) + index)
+            if not fifo_size:
+                return 0
+            n = min(size, (rd.value - wr.value - 1) % fifo_size)
+            data = ctypes.string_at(buf, n)
+            off = wr.value
+            l = min(n, fifo_size - off)
+            self._poke(addr + off, data[:l])
+            self._poke(addr, data[l:])
+            wr.value = (off + n) % fifo_size
+            return n
+
+
+def sim_jlink(target=None):
+    """
+    Returns a jlink.Jlink driving a SimTarget, a default one if target is None.
+    """
+    return jlink.Jlink.from_library(target if target is not None else SimTarget())